@@ -1,24 +1,82 @@
 import os
 import json
 import re
+import copy
+import stat
 import sqlite3
-from functools import lru_cache
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify
-
+import threading
+import time
+import hashlib
+import itertools
+import bisect
+import heapq
+import tempfile
+import queue
+import zlib
+import gzip
+import atexit
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from urllib.parse import parse_qsl
+from functools import lru_cache, wraps
+from flask import (Flask, render_template, request, redirect, url_for, send_from_directory, send_file, jsonify,
+                   abort, g, has_request_context, Response, make_response)
+from werkzeug.security import safe_join
+
+from json_reader_EL import iter_json_records
+from export_EL import export_row, csv_chunks, write_xlsx
+from sdi_rules_EL import (KEEP_BLANK, DASHBOARD_COLUMNS, STATUS_TESTS, description_for, sdi_row,
+                          dashboard_item, dashboard_filters, filter_items)
+from photo_audit_EL import (DERIVATIVE_SIZES, DERIVATIVE_MAX_BYTES, derivative_token, build_derivative,
+                            derivative_cache_bytes, evict_derivatives)
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional; without Pillow the full-size photo is served
+    Image = None
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # without watchdog the folder watcher polls directory mtimes instead
+    Observer = FileSystemEventHandler = None
+
+try:
+    import brotli
+except ImportError:  # responses are gzip-compressed only
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: per-document locks use msvcrt byte-range locks
+    fcntl = None
+    import msvcrt
+
+# Every path below can be overridden with an EL_* environment variable (benchmarks,
+# a local copy of the share); the defaults are the production locations on S:.
 app = Flask(
     __name__,
-    template_folder=r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\Asset_plate_review_EL\review_asset_templates",
-    static_folder=r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\Asset_plate_review_EL\review_asset_templates\static"
+    template_folder=os.environ.get("EL_TEMPLATE_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\Asset_plate_review_EL\review_asset_templates"),
+    static_folder=os.environ.get("EL_STATIC_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\Asset_plate_review_EL\review_asset_templates\static")
 )
 
 # --- Paths ---
-JSON_DIR = r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\Output_jason_api"
-IMG_DIR  = r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test"
+JSON_DIR = os.environ.get("EL_JSON_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\Output_jason_api")
+IMG_DIR  = os.environ.get("EL_IMG_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test")
 
 # --- SQLite DB ---
-DB_PATH   = r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\QR_codes.db"
+DB_PATH   = os.environ.get("EL_DB_PATH", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\QR_codes.db")
 SDI_TABLE = "sdi_dataset_EL"
 
+# Connections are pooled (see _db_session); busy_timeout makes a reader wait out a save.
+# The journal mode is persistent in the DB file. DB_PATH normally lives on the S: share,
+# which the loader and other machines open too, so it keeps SQLite's rollback journal
+# (DELETE). WAL lets readers run during a commit but only works when every process
+# using the DB is on one host: set EL_DB_JOURNAL_MODE=WAL only for a local DB_PATH.
+DB_JOURNAL_MODE    = os.environ.get("EL_DB_JOURNAL_MODE", "DELETE").upper()
+DB_BUSY_TIMEOUT_MS = 5000
+DB_POOL_SIZE       = 4
+
 # Dropdown sources (Attribute default)
 ATTRIBUTE_TABLE    = "Attribute"
 ATTRIBUTE_CODE_COL = "Code"       # filter by 'Electrical'
@@ -26,6 +84,191 @@ ATTRIBUTE_VAL_COL  = "Attribute"  # default value to use
 
 VALID_IMAGE_EXTS = ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']
 
+# --- Local derivative cache (resized copies of the plate photos) ---
+CACHE_DIR             = os.environ.get("EL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".asset_plate_review_EL"))
+DERIVATIVE_DIR        = os.path.join(CACHE_DIR, "derivatives")
+DERIVATIVE_RESCAN_SECONDS = 60             # recount the cache from disk at most this often once others wrote to it
+# DERIVATIVE_SIZES (longest edge per variant) and DERIVATIVE_MAX_BYTES (LRU eviction above
+# this) live in photo_audit_EL, which pre-builds derivatives into the same cache
+IMAGE_MAX_AGE         = 24 * 3600            # Cache-Control max-age for versioned /images URLs (?v=)
+
+# --- Write-behind DB sync (local journal of pending sdi_dataset_EL upserts) ---
+SYNC_JOURNAL_PATH     = os.path.join(CACHE_DIR, "sync_journal.db")
+SYNC_COALESCE_SECONDS = 0.5    # wait this long after an edit so rapid edits flush together
+SYNC_BATCH_SIZE       = 500    # rows per DB transaction
+SYNC_MAX_BACKOFF      = 60     # seconds between retries while the DB stays locked
+SYNC_LEASE_SECONDS    = 30     # one process flushes the journal; another takes over after this
+
+# --- Index snapshot (document + photo indexes persisted for a fast cold start) ---
+SNAPSHOT_PATH         = os.path.join(CACHE_DIR, "index_snapshot.db")
+SNAPSHOT_DELAY        = 5      # seconds after a change before the snapshot is rewritten
+
+# --- Shared state between worker processes (on under serve_EL.py) ---
+SHARED_STATE          = os.environ.get("EL_SHARED_STATE") == "1"
+SHARED_STATE_PATH     = os.path.join(CACHE_DIR, "shared_state.db")
+SHARED_LOG_KEEP_ROWS  = 10000  # a worker that falls further behind rescans the JSON folder
+DOC_LOCK_DIR          = os.path.join(CACHE_DIR, "doc_locks")  # one lock file per edited document
+
+# ---------- METRICS ----------
+# Prometheus-text counters and histograms served on /metrics (no client library needed).
+# _timed(op, phase) counts an operation and its seconds (el_<op>_total / el_<op>_seconds_total)
+# and, inside a request, adds the time to that request's phase breakdown. Requests slower
+# than SLOW_REQUEST_SECONDS are logged with the breakdown (0 disables the log).
+SLOW_REQUEST_SECONDS = float(os.environ.get("EL_SLOW_REQUEST_SECONDS", "1.0"))
+LATENCY_BUCKETS      = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_METRICS_LOCK = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+
+_METRIC_HELP = {
+    "el_http_requests_total": "Requests by route, method and status.",
+    "el_http_request_duration_seconds": "Request latency by route.",
+    "el_http_request_phase_seconds_total": "Request time spent per phase, by route.",
+    "el_fs_listing_total": "Directory listings (scandir) of the JSON/photo folders.",
+    "el_fs_listing_seconds_total": "Time spent listing folders, including per-entry stats.",
+    "el_fs_stat_total": "File stats (listing entries and single-file checks).",
+    "el_fs_stat_seconds_total": "Time spent in single-file stats.",
+    "el_json_read_total": "JSON documents read and parsed.",
+    "el_json_read_seconds_total": "Time spent reading and parsing JSON documents.",
+    "el_json_errors_total": "JSON documents that could not be read or parsed.",
+    "el_photo_lookups_total": "Photo lookups answered from the photo index.",
+    "el_db_connect_total": "SQLite connections opened to DB_PATH.",
+    "el_db_connect_seconds_total": "Time spent opening SQLite connections.",
+    "el_db_session_total": "Pooled DB sessions (one transaction each).",
+    "el_db_session_seconds_total": "Time spent inside DB sessions.",
+    "el_db_statements_total": "SQL statements executed on DB_PATH connections.",
+    "el_render_total": "Jinja template renders.",
+    "el_render_seconds_total": "Time spent rendering templates.",
+    "el_derivative_build_total": "Photo derivatives (thumb/medium) generated.",
+    "el_derivative_build_seconds_total": "Time spent generating photo derivatives.",
+    "el_cache_requests_total": "Cache lookups by cache and result (hit/miss).",
+    "el_shared_changes_applied_total": "Changes from other worker processes applied to this one.",
+    "el_search_total": "Search index queries.",
+    "el_search_seconds_total": "Time spent answering search index queries.",
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _inc(name: str, value: float = 1, **labels):
+    key = (name, _label_key(labels))
+    with _METRICS_LOCK:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(name: str, seconds: float, **labels):
+    key = (name, _label_key(labels))
+    with _METRICS_LOCK:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        h[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        h[-1] += seconds
+
+
+def _cache_result(cache: str, hit: bool):
+    _inc("el_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def _timed(op: str, phase: str = None, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _inc(f"el_{op}_total", **labels)
+        _inc(f"el_{op}_seconds_total", elapsed, **labels)
+        if phase and has_request_context() and hasattr(g, "_phases"):
+            g._phases[phase] = g._phases.get(phase, 0.0) + elapsed
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    def escape(v):
+        return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def _metric_value(value) -> str:
+    """Exact sample text: counts as integers, seconds/gauges at full float precision."""
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _render_metrics(gauges: dict) -> str:
+    with _METRICS_LOCK:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {_METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {_metric_value(value)}")
+    for (name, labels), h in sorted(histograms.items()):
+        describe(name, "histogram")
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), h[:-1]):
+            running += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {running}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_metric_value(h[-1])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {running}")
+    for name, (help_text, value) in sorted(gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_metric_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+@app.before_request
+def _metrics_start():
+    g._started = time.perf_counter()
+    g._phases = {}
+
+
+@app.after_request
+def _metrics_finish(response):
+    started = getattr(g, "_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.endpoint or "unmatched"
+    _inc("el_http_requests_total", route=route, method=request.method, status=response.status_code)
+    _observe("el_http_request_duration_seconds", elapsed, route=route)
+    for phase, seconds in g._phases.items():
+        _inc("el_http_request_phase_seconds_total", seconds, route=route, phase=phase)
+
+    if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+        accounted = sum(g._phases.values())
+        parts = [f"{phase} {seconds:.3f}s" for phase, seconds in
+                 sorted(g._phases.items(), key=lambda kv: kv[1], reverse=True)]
+        parts.append(f"other {max(0.0, elapsed - accounted):.3f}s")
+        print(f"⚠️ Slow request {request.method} {request.full_path.rstrip('?')} "
+              f"{elapsed:.3f}s: {', '.join(parts)}")
+    return response
+
+
+def _render(template: str, **context):
+    with _timed("render", phase="render", template=template):
+        return render_template(template, **context)
+
+
 # ---------- PHOTO RULES ----------
 # Count fraction over all 3; pass requires -1 and -2
 ALL_SHOW  = ['-0', '-1', '-2']         # -0 Asset Plate, -1 Asset Tag, -2 Main Asset
@@ -35,16 +278,110 @@ SEQ_SHOW  = ALL_SHOW[:]                # thumbs to display
 # JSON filename pattern: "<QR>_EL_<Building>.json"
 JSON_NAME_RE = re.compile(r"^(\d+)_EL_(\d+(?:-\d+)?)\.json$")
 
+# Image filename pattern: "<QR> <Building> EL - <seq>.<ext>"
+IMG_NAME_RE = re.compile(r"^(\d+) (\d+(?:-\d+)?) EL - (\d+)(\.[A-Za-z]+)$", re.IGNORECASE)
+
+# ---------- PHOTO INDEX ----------
+# (qr, building, seq) -> {filename, ...}, built from one scandir pass over IMG_DIR.
+# The listing is redone only when the folder mtime moves or the index is older
+# than PHOTO_INDEX_MAX_AGE seconds (some shares do not bump the folder mtime).
+PHOTO_INDEX_MAX_AGE = 30
+
+_PHOTO_INDEX = {}
+_PHOTO_INDEX_LOCK = threading.Lock()
+_photo_index_state = {"dir_mtime": None, "scanned_at": 0.0, "names": set()}
+
+
+def _ext_rank(ext: str) -> int:
+    """Position in VALID_IMAGE_EXTS (same preference order find_image always used)."""
+    if ext in VALID_IMAGE_EXTS:
+        return VALID_IMAGE_EXTS.index(ext)
+    lowered = [e.lower() for e in VALID_IMAGE_EXTS]
+    return lowered.index(ext.lower()) if ext.lower() in lowered else -1
+
+
+def _photo_key(filename: str):
+    m = IMG_NAME_RE.match(filename)
+    if not m or _ext_rank(m.group(4)) < 0:
+        return None
+    qr, building, seq, _ext = m.groups()
+    return (qr, building, seq)
+
+
+def _refresh_photo_index(force: bool = False) -> set:
+    """
+    Bring the photo index up to date with IMG_DIR.
+    Returns the (qr, building) pairs whose photo set changed.
+    """
+    try:
+        dir_mtime = os.stat(IMG_DIR).st_mtime_ns
+    except OSError as e:
+        print(f"⚠️ Image folder not reachable: {e}")
+        return set()
+
+    state = _photo_index_state
+    if (not force and dir_mtime == state["dir_mtime"]
+            and time.time() - state["scanned_at"] < PHOTO_INDEX_MAX_AGE):
+        return set()
+
+    names = set()
+    with _timed("fs_listing", phase="photo_listing", folder="images"), os.scandir(IMG_DIR) as it:
+        for de in it:
+            if _photo_key(de.name):
+                names.add(de.name)
+
+    changed = set()
+    with _PHOTO_INDEX_LOCK:
+        for name in state["names"] - names:
+            key = _photo_key(name)
+            bucket = _PHOTO_INDEX.get(key)
+            if bucket:
+                bucket.discard(name)
+                if not bucket:
+                    del _PHOTO_INDEX[key]
+            changed.add(key[:2])
+        for name in names - state["names"]:
+            key = _photo_key(name)
+            _PHOTO_INDEX.setdefault(key, set()).add(name)
+            changed.add(key[:2])
+        state.update(dir_mtime=dir_mtime, scanned_at=time.time(), names=names)
+    _notify_docs_changed({f"{qr}_EL_{building}" for qr, building in changed})
+    return changed
+
 
 def find_image(qr: str, building: str, seq_tag: str):
-    """Find image by pattern: '<QR> <Building> EL - <seq>.<ext>'."""
+    """Find image by pattern: '<QR> <Building> EL - <seq>.<ext>' (answered from the photo index)."""
     seq = seq_tag.replace('-', '').strip()
-    base = f"{qr} {building} EL - {seq}"
-    for ext in VALID_IMAGE_EXTS:
-        candidate = os.path.join(IMG_DIR, base + ext)
-        if os.path.exists(candidate):
-            return os.path.basename(candidate)
-    return None
+    _inc("el_photo_lookups_total")
+    with _PHOTO_INDEX_LOCK:
+        bucket = _PHOTO_INDEX.get((qr, building, seq))
+        if not bucket:
+            return None
+        return min(bucket, key=lambda n: _ext_rank(os.path.splitext(n)[1]))
+
+
+def _photo_file_changed(name: str) -> bool:
+    """Apply one photo add/delete reported by the folder watcher. Returns True if the index changed."""
+    key = _photo_key(name)
+    if key is None:
+        return False
+    present = os.path.isfile(os.path.join(IMG_DIR, name))
+    with _PHOTO_INDEX_LOCK:
+        names = _photo_index_state["names"]
+        if present == (name in names):
+            return False
+        if present:
+            names.add(name)
+            _PHOTO_INDEX.setdefault(key, set()).add(name)
+        else:
+            names.discard(name)
+            bucket = _PHOTO_INDEX.get(key)
+            if bucket:
+                bucket.discard(name)
+                if not bucket:
+                    del _PHOTO_INDEX[key]
+    _notify_docs_changed({f"{key[0]}_EL_{key[1]}"})
+    return True
 
 
 @lru_cache(maxsize=1)
@@ -52,31 +389,113 @@ def _connectable():
     return os.path.exists(DB_PATH)
 
 
+# ---------- DB ACCESS ----------
+_db_pool = queue.LifoQueue()
+_db_cache = {"sdi_cols": None, "attribute": {}, "journal_mode_set": False}
+_DB_CACHE_LOCK = threading.Lock()
+
+# Errors after which the cached column list / Attribute lookups may be wrong (schema edit);
+# "database is locked" and other busy errors are left to the caller's retry.
+_SCHEMA_ERRORS = ("no such table", "no such column", "has no column")
+
+
+def _is_schema_error(e: Exception) -> bool:
+    return any(text in str(e).lower() for text in _SCHEMA_ERRORS)
+
+
+def _set_journal_mode(conn):
+    """Apply DB_JOURNAL_MODE once per process (it is stored in the DB file), on the first connection."""
+    with _DB_CACHE_LOCK:
+        if _db_cache["journal_mode_set"]:
+            return
+        _db_cache["journal_mode_set"] = True
+    try:
+        mode = conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}").fetchone()[0]
+        if mode.upper() != DB_JOURNAL_MODE:  # e.g. leaving WAL while another connection is open
+            print(f"⚠️ DB journal_mode is {mode}, wanted {DB_JOURNAL_MODE}")
+    except sqlite3.DatabaseError as e:
+        print(f"⚠️ Could not set journal_mode={DB_JOURNAL_MODE}: {e}")
+
+
+def _db_open():
+    with _timed("db_connect", phase="db"):
+        conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.set_trace_callback(lambda _sql: _inc("el_db_statements_total"))
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+    _set_journal_mode(conn)
+    return conn
+
+
+@contextmanager
+def _db_session():
+    """
+    Borrow a pooled connection to DB_PATH. Commits on success, rolls back on error;
+    a connection that raised is closed instead of going back to the pool.
+    """
+    try:
+        conn = _db_pool.get_nowait()
+    except queue.Empty:
+        conn = _db_open()
+    try:
+        with _timed("db_session", phase="db"), conn:
+            yield conn
+    except Exception:
+        conn.close()
+        raise
+    if _db_pool.qsize() < DB_POOL_SIZE:
+        _db_pool.put(conn)
+    else:
+        conn.close()
+
+
+def _invalidate_db_caches():
+    """Forget the cached sdi_dataset_EL column list and Attribute lookups (e.g. after a schema edit)."""
+    with _DB_CACHE_LOCK:
+        _db_cache["sdi_cols"] = None
+        _db_cache["attribute"].clear()
+    _connectable.cache_clear()
+    with _ITEM_CACHE_LOCK:
+        _item_cache_state["epoch"] += 1
+        _item_cache.clear()
+    _index_generation["value"] = next(_generation_seq)
+
+
 def _fetch_attribute_default_for_code(code_value: str) -> str:
+    """Attribute default for a Code; memoized until _invalidate_db_caches() (failures are not cached)."""
+    with _DB_CACHE_LOCK:
+        hit = code_value in _db_cache["attribute"]
+        value = _db_cache["attribute"].get(code_value)
+    _cache_result("attribute_default", hit)
+    if hit:
+        return value
     if not _connectable():
         return ""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
+        with _db_session() as conn:
             q = f'SELECT "{ATTRIBUTE_VAL_COL}" AS attr FROM "{ATTRIBUTE_TABLE}" WHERE "{ATTRIBUTE_CODE_COL}" = ? LIMIT 1'
-            cur.execute(q, (code_value,))
-            row = cur.fetchone()
-            return (row["attr"] or "").strip() if row else ""
+            row = conn.execute(q, (code_value,)).fetchone()
+            value = (row["attr"] or "").strip() if row else ""
     except Exception as e:
         print(f"⚠️ DB default attribute fetch failed: {e}")
         return ""
-
-
-def _desc_from_ubc_or_branch(ubc_tag: str, branch: str) -> str:
-    tag = (ubc_tag or "").strip() or (branch or "").strip()
-    return f"Panel - {tag}" if tag else "Panel"
+    with _DB_CACHE_LOCK:
+        _db_cache["attribute"][code_value] = value
+    return value
 
 
 def _db_existing_cols(conn) -> list:
-    cur = conn.cursor()
-    cur.execute(f'PRAGMA table_info("{SDI_TABLE}")')
-    return [r[1] for r in cur.fetchall()]
+    """Column names of sdi_dataset_EL, read once per schema (see _invalidate_db_caches)."""
+    with _DB_CACHE_LOCK:
+        cols = _db_cache["sdi_cols"]
+    if cols is None:
+        cur = conn.cursor()
+        cur.execute(f'PRAGMA table_info("{SDI_TABLE}")')
+        cols = [r[1] for r in cur.fetchall()]
+        if cols:
+            with _DB_CACHE_LOCK:
+                _db_cache["sdi_cols"] = cols
+    return cols
 
 
 def _db_upsert_el_row(conn, row: dict):
@@ -115,278 +534,2118 @@ def _db_upsert_el_row(conn, row: dict):
     return "inserted"
 
 
-def _sync_db_from_structured(qr: str, building: str, sd: dict):
+def _db_row_from_structured(qr: str, building: str, sd: dict) -> dict:
     """
-    Prepare row and upsert into sdi_dataset_EL.
+    Prepare an sdi_dataset_EL row from structured_data.
     Maps Approved: JSON 'True' -> DB '1'; otherwise ''.
     """
-    ubc = (sd.get("UBC Asset Tag") or "").strip()
-    branch = (sd.get("Branch Panel") or "").strip()
-    ubc_final = ubc if ubc else branch
-
-    attr = (sd.get("Attribute") or "").strip()
-    if not attr:
-        attr = _fetch_attribute_default_for_code("Electrical")
-
-    approved_db = "1" if (sd.get("Approved") or "").strip() == "True" else ""
-
-    row = {
-        "QR Code": qr,
-        "Building": building,
-        "Description": _desc_from_ubc_or_branch(ubc_final, branch),
-        "UBC Asset Tag": ubc_final,
-        "Branch Panel": branch,
-        "Ampere": (sd.get("Ampere") or "").strip(),
-        "Supply From": (sd.get("Supply From") or "").strip(),
-        "Volts": (sd.get("Volts") or "").strip(),
-        "Location": (sd.get("Location") or "").strip(),
-        "Asset Group": (sd.get("Asset Group") or "").strip(),
-        "Attribute": attr,
-        "Approved": approved_db,
-    }
+    row = sdi_row(qr, building, sd)
+    if not row["Attribute"]:
+        row["Attribute"] = _fetch_attribute_default_for_code("Electrical")
+    row["Approved"] = "1" if row["Approved"] == "True" else ""
+    return row
+
+
+def _sync_db_rows(rows: list):
+    """Upsert several prepared rows into sdi_dataset_EL in one transaction."""
+    try:
+        with _db_session() as conn:
+            for row in rows:
+                _db_upsert_el_row(conn, row)
+    except sqlite3.OperationalError as e:
+        if _is_schema_error(e):
+            _invalidate_db_caches()  # the table was altered under us
+        raise
+
 
-    with sqlite3.connect(DB_PATH) as conn:
-        _db_upsert_el_row(conn, row)
+def _sync_db_from_structured(qr: str, building: str, sd: dict):
+    """Prepare row and upsert into sdi_dataset_EL."""
+    _sync_db_rows([_db_row_from_structured(qr, building, sd)])
+
+
+# ---------- WRITE-BEHIND DB SYNC ----------
+# Saves journal their prepared rows locally and return; a background worker upserts
+# them into sdi_dataset_EL in batches. The journal is keyed by ("QR Code","Building"),
+# so repeated edits of one asset coalesce into the latest row, and it survives restarts.
+# A row leaves the journal only after the DB transaction that wrote it has committed.
+# The journal is shared by worker processes; so are the flush lease and the last flush
+# time/error (sync_meta), so /api/sync_status answers the same on every worker.
+_JOURNAL_LOCK = threading.Lock()
+_journal = {"conn": None}
+_sync_wakeup = threading.Event()
+_sync_state = {"thread": None, "last_error": None, "retry_at": 0.0, "backoff": 0.0}
+_sync_seq = itertools.count(time.time_ns())
+
+
+def _journal_conn():
+    if _journal["conn"] is None:
+        os.makedirs(os.path.dirname(SYNC_JOURNAL_PATH), exist_ok=True)
+        conn = sqlite3.connect(SYNC_JOURNAL_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                qr TEXT, building TEXT, row_json TEXT, seq INTEGER,
+                enqueued_at REAL, attempts INTEGER DEFAULT 0, last_error TEXT,
+                PRIMARY KEY (qr, building)
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, pid INTEGER, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value TEXT)")
         conn.commit()
+        _journal["conn"] = conn
+    return _journal["conn"]
 
 
-def load_json_items():
-    items = []
+def _queue_db_rows(rows: list, context: str):
+    """Journal rows for the sync worker; falls back to a direct sync if the journal is unusable."""
+    if not rows:
+        return
+    try:
+        with _JOURNAL_LOCK:
+            conn = _journal_conn()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pending (qr, building, row_json, seq, enqueued_at, attempts, last_error) "
+                    "VALUES (?, ?, ?, ?, ?, 0, NULL)",
+                    [(r["QR Code"], r["Building"], json.dumps(r, ensure_ascii=False), next(_sync_seq), time.time())
+                     for r in rows],
+                )
+    except Exception as e:
+        print(f"⚠️ Sync journal unavailable ({context}), writing to DB directly: {e}")
+        try:
+            _sync_db_rows(rows)
+        except Exception as e:
+            print(f"⚠️ DB sync failed ({context}): {e}")
+        return
+    _ensure_sync_worker()
+    _sync_wakeup.set()
 
-    for filename in os.listdir(JSON_DIR):
-        if not filename.endswith(".json") or filename.endswith("_raw_ocr.json"):
-            continue
 
-        m = JSON_NAME_RE.match(filename)
-        if not m:
-            continue
+def _journal_depth() -> int:
+    with _JOURNAL_LOCK:
+        return _journal_conn().execute("SELECT COUNT(*) FROM pending").fetchone()[0]
 
-        qr, building = m.groups()
-        doc_id = filename[:-5]  # strip ".json"
 
+def _hold_sync_lease() -> bool:
+    """
+    Take or renew the flush lease. Worker processes share the journal, and two flushers
+    could write an asset's rows out of order, so only the lease holder flushes. A lease
+    held by another live worker is only read, never rewritten.
+    """
+    now, pid = time.time(), os.getpid()
+    with _JOURNAL_LOCK:
+        conn = _journal_conn()
+        lease = conn.execute("SELECT pid, expires FROM lease WHERE name = 'flush'").fetchone()
+        if lease is not None and lease[0] != pid and lease[1] >= now:
+            return False
+        with conn:
+            if lease is None:
+                conn.execute("INSERT OR IGNORE INTO lease (name, pid, expires) VALUES ('flush', ?, 0)", (pid,))
+            # conditional, so two workers that both saw an expired lease cannot both take it
+            cur = conn.execute("UPDATE lease SET pid = ?, expires = ? "
+                               "WHERE name = 'flush' AND (pid = ? OR expires < ?)",
+                               (pid, now + SYNC_LEASE_SECONDS, pid, now))
+    return cur.rowcount == 1
+
+
+def _set_sync_meta(**values):
+    """Record last_flush_at / last_error for every worker's /api/sync_status (None clears)."""
+    with _JOURNAL_LOCK:
+        conn = _journal_conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)",
+                             [(k, None if v is None else str(v)) for k, v in values.items()])
+
+
+def _sync_meta() -> dict:
+    with _JOURNAL_LOCK:
+        return dict(_journal_conn().execute("SELECT key, value FROM sync_meta"))
+
+
+def _flush_sync_journal() -> int:
+    """Write one batch of journaled rows to sdi_dataset_EL. Returns how many were flushed."""
+    with _JOURNAL_LOCK:
+        batch = _journal_conn().execute(
+            "SELECT qr, building, row_json, seq FROM pending ORDER BY attempts, seq LIMIT ?",
+            (SYNC_BATCH_SIZE,)).fetchall()
+    if not batch:
+        return 0
+
+    rows = [json.loads(r[2]) for r in batch]
+    for row in rows:
+        # the default may not have been readable when the row was journaled (DB locked)
+        if not row.get("Attribute"):
+            row["Attribute"] = _fetch_attribute_default_for_code("Electrical")
+
+    done, failed = [], []
+    try:
+        _sync_db_rows(rows)
+        done = batch
+    except sqlite3.OperationalError:
+        raise  # locked/busy: the caller backs off and retries the whole batch
+    except Exception:
+        # Something in the batch is bad: isolate it so the other rows still go through.
+        for r, row in zip(batch, rows):
+            try:
+                _sync_db_rows([row])
+                done.append(r)
+            except Exception as e:
+                failed.append((str(e), r[0], r[1], r[3]))
+
+    with _JOURNAL_LOCK:
+        conn = _journal_conn()
+        with conn:
+            # the seq check keeps rows re-queued by an edit made during the flush
+            conn.executemany("DELETE FROM pending WHERE qr = ? AND building = ? AND seq = ?",
+                             [(r[0], r[1], r[3]) for r in done])
+            conn.executemany("UPDATE pending SET attempts = attempts + 1, last_error = ? "
+                             "WHERE qr = ? AND building = ? AND seq = ?", failed)
+            if done:
+                conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES ('last_flush_at', ?)",
+                             (str(time.time()),))
+    if failed:
+        _sync_state["last_error"] = failed[0][0]
+        print(f"⚠️ DB sync failed for {len(failed)} row(s), will retry: {failed[0][0]}")
+    return len(done)
+
+
+def _sync_worker():
+    while True:
+        _sync_wakeup.wait(timeout=max(_sync_state["backoff"], 5.0))
+        _sync_wakeup.clear()
+        wait = _sync_state["retry_at"] - time.time()
+        time.sleep(max(wait, SYNC_COALESCE_SECONDS))
+        try:
+            if not _hold_sync_lease():
+                continue  # another worker process is flushing the (shared) journal
+            while _flush_sync_journal() == SYNC_BATCH_SIZE and _hold_sync_lease():
+                pass
+            with _JOURNAL_LOCK:
+                retrying = _journal_conn().execute("SELECT COUNT(*) FROM pending WHERE attempts > 0").fetchone()[0]
+            if retrying:
+                raise RuntimeError(_sync_state["last_error"] or f"{retrying} row(s) failed to sync")
+            if _sync_meta().get("last_error") is not None:  # possibly left by a previous holder
+                _set_sync_meta(last_error=None)
+            _sync_state.update(last_error=None, backoff=0.0, retry_at=0.0)
+        except Exception as e:
+            backoff = min(max(_sync_state["backoff"] * 2, 1.0), SYNC_MAX_BACKOFF)
+            _sync_state.update(last_error=str(e), backoff=backoff, retry_at=time.time() + backoff)
+            print(f"⚠️ DB sync deferred ({e}); retrying in {backoff:.0f}s")
+            try:
+                _set_sync_meta(last_error=e)
+            except Exception:
+                pass  # the journal itself is what failed; the local error is still reported
+            _sync_wakeup.set()
+
+
+def _ensure_sync_worker():
+    with _JOURNAL_LOCK:
+        thread = _sync_state["thread"]
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_sync_worker, name="db-sync", daemon=True)
+            _sync_state["thread"] = thread
+            thread.start()
+
+
+# ---------- DOCUMENT INDEX ----------
+# Parsed JSON documents keyed by filename. Each entry remembers the (mtime, size)
+# it was read at, so a refresh only re-reads files that were added or changed.
+# New/changed files are read READER_THREADS at a time (json_reader_EL); set
+# READER_PROCESSES > 0 to also parse on a process pool.
+READER_THREADS   = 8
+READER_PROCESSES = 0
+
+_DOC_INDEX = {}
+_DOC_ORDER = []  # sorted _DOC_INDEX keys (Save & Next order); changed only via _index_put/_index_drop
+_DOC_INDEX_LOCK = threading.RLock()
+
+# Callables taking a set of doc_ids whose document or photo set changed, so derived state
+# (navigation views, ...) is updated per document instead of rebuilt from the corpus.
+_doc_change_listeners = []
+
+# Bumped on every index change (and DB cache reset); cached responses are keyed on it.
+_generation_seq = itertools.count(1)
+_index_generation = {"value": 0}
+
+# Forms echo a document's version back for optimistic concurrency. It is a hash of the
+# content (see _doc_version), so every worker process, and the same process after a
+# restart, gives the same document the same version.
+
+
+def _index_put(filename: str, entry: dict):
+    """Insert/replace an index entry; caller holds _DOC_INDEX_LOCK."""
+    if filename not in _DOC_INDEX:
+        bisect.insort(_DOC_ORDER, filename)
+    _DOC_INDEX[filename] = entry
+
+
+def _index_drop(filename: str):
+    """Remove an index entry; caller holds _DOC_INDEX_LOCK."""
+    if _DOC_INDEX.pop(filename, None) is None:
+        return
+    i = bisect.bisect_left(_DOC_ORDER, filename)
+    if i < len(_DOC_ORDER) and _DOC_ORDER[i] == filename:
+        del _DOC_ORDER[i]
+
+
+def _notify_docs_changed(doc_ids):
+    if not doc_ids:
+        return
+    _index_generation["value"] = next(_generation_seq)
+    for listener in _doc_change_listeners:
         try:
-            with open(os.path.join(JSON_DIR, filename), 'r', encoding='utf-8') as f:
-                raw = json.load(f)
+            listener(set(doc_ids))
+        except Exception as e:
+            print(f"⚠️ Index listener {listener.__name__} failed: {e}")
+
+
+def _is_el_json(filename: str) -> bool:
+    return (filename.endswith(".json") and not filename.endswith("_raw_ocr.json")
+            and bool(JSON_NAME_RE.match(filename)))
+
+
+def _doc_entry(filename: str, sig: tuple, raw=None, error=None):
+    """Index entry for a loaded document (raw is None if it could not be loaded)."""
+    entry = {"sig": sig, "raw": None, "ok": False, "version": None}
+    if error is None and not isinstance(raw, dict):
+        error = ValueError("JSON root is not an object")
+    if error is not None:
+        print(f"❌ Error loading {filename}: {error}")
+        return entry
+    entry["raw"] = raw
+    if isinstance(raw.get("structured_data") or {}, dict):
+        entry["ok"] = True
+    else:
+        print(f"⚠️ Skipped {filename}: 'structured_data' is not a dict")
+    return entry
+
+
+def _parse_doc(filename: str, sig: tuple):
+    """Read one JSON file into an index entry."""
+    try:
+        with _timed("json_read", phase="json_read"), \
+                open(os.path.join(JSON_DIR, filename), 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except Exception as e:
+        _inc("el_json_errors_total")
+        return _doc_entry(filename, sig, error=e)
+    return _doc_entry(filename, sig, raw)
 
-            data = raw.get("structured_data") or {}
-            if not isinstance(data, dict):
-                print(f"⚠️ Skipped {filename}: 'structured_data' is not a dict")
+
+def _stat_sig(st) -> tuple:
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _refresh_doc_index() -> set:
+    """
+    One directory pass over JSON_DIR; re-reads only new/changed files and drops deleted ones.
+    Returns the doc_ids that were added, changed or removed.
+    """
+    seen = {}
+    with _timed("fs_listing", phase="json_listing", folder="json"), os.scandir(JSON_DIR) as it:
+        for de in it:
+            if not _is_el_json(de.name):
                 continue
+            try:
+                seen[de.name] = _stat_sig(de.stat())
+            except OSError:
+                continue
+    _inc("el_fs_stat_total", len(seen))
+
+    with _DOC_INDEX_LOCK:
+        removed = [fn for fn in _DOC_INDEX if fn not in seen]
+        stale = [fn for fn, sig in seen.items()
+                 if fn not in _DOC_INDEX or _DOC_INDEX[fn]["sig"] != sig]
+
+    fresh = {}
+    started = time.perf_counter()
+    for rec in iter_json_records(JSON_DIR, sorted(stale), JSON_NAME_RE,
+                                 threads=READER_THREADS, processes=READER_PROCESSES):
+        fresh[rec.filename] = _doc_entry(rec.filename, seen[rec.filename], rec.doc, rec.error)
+        if rec.error is not None:
+            _inc("el_json_errors_total")
+    if fresh:
+        elapsed = time.perf_counter() - started
+        _inc("el_json_read_total", len(fresh))
+        _inc("el_json_read_seconds_total", elapsed)
+        if has_request_context() and hasattr(g, "_phases"):
+            g._phases["json_read"] = g._phases.get("json_read", 0.0) + elapsed
+
+    with _DOC_INDEX_LOCK:
+        for fn in removed:
+            _index_drop(fn)
+        if len(fresh) > 256:  # first load / mass drop: one sort beats many insorts
+            _DOC_INDEX.update(fresh)
+            _DOC_ORDER[:] = sorted(_DOC_INDEX)
+        else:
+            for fn, entry in fresh.items():
+                _index_put(fn, entry)
+
+    changed = {fn[:-5] for fn in removed} | {fn[:-5] for fn in fresh}
+    _notify_docs_changed(changed)
+    return changed
+
+
+def _get_doc(doc_id: str):
+    """
+    Return a private copy of the parsed JSON for doc_id, or None if the file is gone.
+    Only the one file is stat'ed to catch edits made outside the app.
+    """
+    found = _get_doc_versioned(doc_id)
+    return found[0] if found else None
+
 
-            # Ensure keys
-            keep_blank = ["UBC Asset Tag","Branch Panel","Ampere","Supply From","Volts","Location",
-                          "Attribute","Approved"]
-            for k in keep_blank:
-                data.setdefault(k, "")
-            data.setdefault("Flagged", "false")
-
-            # default Attribute for Electrical
-            if not (data.get("Attribute") or "").strip():
-                default_attr = _fetch_attribute_default_for_code("Electrical")
-                if default_attr:
-                    data["Attribute"] = default_attr
-
-            # Derived Description
-            data["Description"] = _desc_from_ubc_or_branch(data.get("UBC Asset Tag"), data.get("Branch Panel"))
-
-            # ---- Photo logic (your rule) ----
-            present_map = {tag: bool(find_image(qr, building, tag)) for tag in ALL_SHOW}
-            pass_ok = all(present_map.get(tag, False) for tag in REQUIRED)
-            present_all = sum(1 for tag in ALL_SHOW if present_map.get(tag, False))
-            fraction = f"{present_all}/3"
-
-            friendly_map = {'-0': 'Asset Plate', '-1': 'Asset Tag', '-2': 'Main Asset'}
-            missing_list = ", ".join(friendly_map[t] for t in ALL_SHOW if not present_map.get(t, False))
-
-            items.append({
-                "doc_id": doc_id,
-                "qr_code": qr,
-                "building": building,
-                "asset_type": raw.get("asset_type", ""),
-                "Flagged": data.get("Flagged", "false"),
-                "Approved": data.get("Approved", ""),
-                "Modified": raw.get("modified", False),
-
-                # ✅/❌ and fraction
-                "Missed Photo": "NO" if pass_ok else "YES",
-                "Photos Summary": fraction,
-                "Missing List": missing_list,
-
-                **data
-            })
+def _get_doc_versioned(doc_id: str):
+    """Like _get_doc, but returns (raw_copy, version), or None if the file is gone."""
+    entry = _current_doc_entry(doc_id)
+    if entry is None:
+        return None
+    return copy.deepcopy(entry["raw"]), _doc_version(entry)
+
+
+def _doc_version(entry: dict) -> str:
+    """Content hash of an index entry's document, computed on first use and kept on the entry."""
+    version = entry["version"]
+    if version is None:
+        if entry["raw"] is not None:
+            blob = json.dumps(entry["raw"], sort_keys=True, ensure_ascii=False)
+        else:
+            blob = repr(entry["sig"])
+        version = entry["version"] = hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+    return version
+
+
+def _current_doc_entry(doc_id: str):
+    """
+    The index entry for doc_id after one stat of its file (re-read if it changed, dropped
+    if it is gone), or None. Shared, not a copy: callers must not modify entry["raw"].
+    """
+    filename = f"{doc_id}.json"
+    try:
+        with _timed("fs_stat", phase="stat"):
+            sig = _stat_sig(os.stat(os.path.join(JSON_DIR, filename)))
+    except OSError:
+        with _DOC_INDEX_LOCK:
+            known = filename in _DOC_INDEX
+            _index_drop(filename)
+        if known:
+            _notify_docs_changed({doc_id})
+        return None
+
+    with _DOC_INDEX_LOCK:
+        entry = _DOC_INDEX.get(filename)
+    _cache_result("doc_index", entry is not None and entry["sig"] == sig)
+    if entry is None or entry["sig"] != sig:
+        entry = _parse_doc(filename, sig)
+        with _DOC_INDEX_LOCK:
+            _index_put(filename, entry)
+        _notify_docs_changed({doc_id})
+    if entry["raw"] is None:
+        raise ValueError(f"could not load {filename}")
+    return entry
+
+
+def _remember_doc(doc_id: str, raw: dict) -> str:
+    """Record a document the app has just written so the index does not re-read it."""
+    filename = f"{doc_id}.json"
+    sig = _stat_sig(os.stat(os.path.join(JSON_DIR, filename)))
+    entry = {"sig": sig, "raw": copy.deepcopy(raw), "ok": True, "version": None}
+    version = _doc_version(entry)
+    with _DOC_INDEX_LOCK:
+        _index_put(filename, entry)
+    _notify_docs_changed({doc_id})
+    _shared_publish("doc", [doc_id])
+    return version
+
+
+# ---------- DOCUMENT STORE ----------
+# Review writes go through _update_doc(): a per-document lock around read-modify-write,
+# temp file + os.replace so a crash never leaves a truncated JSON, a version check for
+# optimistic concurrency, and no write at all when the mutation changed nothing.
+# The lock is a thread lock plus an exclusive lock on DOC_LOCK_DIR/<doc_id>.lock, so
+# worker processes sharing the cache folder (serve_EL.py) also take turns.
+_DOC_LOCKS = {}
+
+
+def _doc_lock(doc_id: str):
+    with _DOC_INDEX_LOCK:
+        lock = _DOC_LOCKS.get(doc_id)
+        if lock is None:
+            lock = _DOC_LOCKS[doc_id] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _doc_file_lock(doc_id: str):
+    """Hold the cross-process lock file of doc_id (blocking until other processes release it)."""
+    os.makedirs(DOC_LOCK_DIR, exist_ok=True)
+    with open(os.path.join(DOC_LOCK_DIR, f"{doc_id}.lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10s
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_json_atomic(path: str, data: dict):
+    folder, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600 and os.replace keeps that; keep the JSON's own permissions
+        try:
+            os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        # Windows refuses the rename while another process has the target open; retry briefly.
+        for attempt in range(5):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:
+                if attempt == 4:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _update_doc(doc_id: str, mutate, expected_version=None):
+    """
+    Apply mutate(json_data) to doc_id under its locks and persist the result atomically.
+    Returns (status, json_data, version) where status is one of
+    "saved", "unchanged", "conflict" (expected_version is stale) or "missing".
+    """
+    with _doc_lock(doc_id), _doc_file_lock(doc_id):
+        found = _get_doc_versioned(doc_id)
+        if found is None:
+            return "missing", None, None
+        json_data, version = found
+        if expected_version is not None and expected_version != version:
+            return "conflict", json_data, version
+
+        before = copy.deepcopy(json_data)
+        mutate(json_data)
+        if json_data == before:
+            return "unchanged", json_data, version
+
+        _write_json_atomic(os.path.join(JSON_DIR, f"{doc_id}.json"), json_data)
+        return "saved", json_data, _remember_doc(doc_id, json_data)
+
+
+def _build_item(filename: str, raw: dict) -> dict:
+    m = JSON_NAME_RE.match(filename)
+    qr, building = m.groups()
+    doc_id = filename[:-5]  # strip ".json"
+
+    sd = raw.get("structured_data") or {}
+    # default Attribute for Electrical
+    default_attr = "" if (sd.get("Attribute") or "").strip() else _fetch_attribute_default_for_code("Electrical")
+
+    # ---- Photo logic (your rule) ----
+    present_map = {tag: bool(find_image(qr, building, tag)) for tag in ALL_SHOW}
+    pass_ok = all(present_map.get(tag, False) for tag in REQUIRED)
+    present_all = sum(1 for tag in ALL_SHOW if present_map.get(tag, False))
+    fraction = f"{present_all}/3"
+
+    friendly_map = {'-0': 'Asset Plate', '-1': 'Asset Tag', '-2': 'Main Asset'}
+    missing_list = ", ".join(friendly_map[t] for t in ALL_SHOW if not present_map.get(t, False))
+
+    return {
+        "doc_id": doc_id,
+        "asset_type": raw.get("asset_type", ""),
+        "Photos Summary": fraction,
+        "Missing List": missing_list,
+
+        # structured_data with the blank fields, Description and the status columns
+        **dashboard_item(qr, building, sd, raw.get("modified", False), not pass_ok, default_attr)
+    }
+
+
+_index_scan_state = {"done": False}
+
+
+def _refresh_indexes():
+    """
+    Make sure the indexes reflect the folders before a request answers from them. Once they
+    are built and the folder watcher runs, the watcher and the change listeners keep them
+    current, so this costs nothing per request; without a live watcher, rescan the folders.
+    """
+    if _snapshot_state["revalidating"]:  # serve the snapshot as loaded until it is checked
+        return
+    watcher = _watch_state["thread"]
+    if _index_scan_state["done"] and watcher is not None and watcher.is_alive():
+        return
+    _refresh_doc_index()
+    _refresh_photo_index()
+    _index_scan_state["done"] = True
+
+
+# Dashboard items built from the index are kept per document until that document or its
+# photos change (listener), or the Attribute default does. Callers must not mutate them.
+_item_cache = {}  # filename -> (index entry, attribute default, item)
+_item_cache_state = {"epoch": 0}
+_ITEM_CACHE_LOCK = threading.Lock()
+
+
+def _item_cache_docs_changed(doc_ids):
+    with _ITEM_CACHE_LOCK:
+        _item_cache_state["epoch"] += 1  # an item being built right now may already be stale
+        for doc_id in doc_ids:
+            _item_cache.pop(f"{doc_id}.json", None)
+
+
+_doc_change_listeners.append(_item_cache_docs_changed)
+
+
+def load_json_items():
+    _refresh_indexes()
+    with _DOC_INDEX_LOCK:
+        entries = [(fn, _DOC_INDEX[fn]) for fn in _DOC_ORDER if _DOC_INDEX[fn]["ok"]]
+    default_attr = _fetch_attribute_default_for_code("Electrical")
+
+    items, missing = [], []
+    with _ITEM_CACHE_LOCK:
+        epoch = _item_cache_state["epoch"]
+        for filename, entry in entries:
+            cached = _item_cache.get(filename)
+            if cached is not None and cached[0] is entry and cached[1] == default_attr:
+                items.append(cached[2])
+            else:
+                items.append(None)
+                missing.append((len(items) - 1, filename, entry))
+    _cache_result("dashboard_item", not missing)
+
+    built = []
+    for pos, filename, entry in missing:
+        try:
+            item = _build_item(filename, entry["raw"])
         except Exception as e:
             print(f"❌ Error loading {filename}: {e}")
-    return items
+            continue
+        items[pos] = item
+        built.append((filename, entry, item))
+    if built:
+        with _ITEM_CACHE_LOCK:
+            if _item_cache_state["epoch"] == epoch:
+                _item_cache.update((fn, (entry, default_attr, item)) for fn, entry, item in built)
+    return [item for item in items if item is not None]
+
+
+# ---------- INDEX SNAPSHOT ----------
+# The document and photo indexes are persisted to SNAPSHOT_PATH (local SQLite, JSON
+# zlib-compressed, with the (mtime, size) each file was read at). On the first request
+# the snapshot is loaded and a background pass revalidates it against the folder
+# listings, re-reading only what changed; dashboards are served from the snapshot in
+# the meantime. Changes are written back SNAPSHOT_DELAY seconds later, per document.
+SNAPSHOT_FORMAT = "1"
+
+_SNAPSHOT_LOCK = threading.Lock()
+_snapshot_state = {
+    "loaded": False, "revalidating": False, "thread": None,
+    "dirty": set(), "photo_names": set(), "wake": threading.Event(),
+}
+
+
+def _snapshot_conn():
+    os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+    conn = sqlite3.connect(SNAPSHOT_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS docs (
+            filename TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, ok INTEGER, raw BLOB
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS photos (name TEXT PRIMARY KEY)")
+
+    # a snapshot of other folders (or an older layout) is worthless; start it over
+    want = {"format": SNAPSHOT_FORMAT, "json_dir": JSON_DIR, "img_dir": IMG_DIR}
+    have = dict(conn.execute("SELECT key, value FROM meta"))
+    if have != want:
+        with conn:
+            conn.execute("DELETE FROM docs")
+            conn.execute("DELETE FROM photos")
+            conn.execute("DELETE FROM meta")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", want.items())
+    return conn
+
+
+def _load_snapshot() -> int:
+    """Fill the (empty) indexes from the snapshot. Returns the number of documents loaded."""
+    conn = _snapshot_conn()
+    try:
+        docs = {}
+        for filename, mtime_ns, size, ok, blob in conn.execute(
+                "SELECT filename, mtime_ns, size, ok, raw FROM docs"):
+            raw = json.loads(zlib.decompress(blob).decode("utf-8")) if blob is not None else None
+            docs[filename] = {"sig": (mtime_ns, size), "raw": raw, "ok": bool(ok), "version": None}
+        names = {name for (name,) in conn.execute("SELECT name FROM photos")}
+    finally:
+        conn.close()
+
+    with _DOC_INDEX_LOCK:
+        for fn, entry in docs.items():
+            _DOC_INDEX.setdefault(fn, entry)
+        _DOC_ORDER[:] = sorted(_DOC_INDEX)
+    with _PHOTO_INDEX_LOCK:
+        for name in names:
+            _PHOTO_INDEX.setdefault(_photo_key(name), set()).add(name)
+        # scanned_at stays 0, so the next photo refresh relists IMG_DIR
+        _photo_index_state["names"] = set(names)
+    _snapshot_state["photo_names"] = set(names)
+    return len(docs)
+
+
+def _save_snapshot():
+    """Write documents changed since the last save, and the photo listing diff."""
+    with _SNAPSHOT_LOCK:
+        dirty, _snapshot_state["dirty"] = _snapshot_state["dirty"], set()
+    with _DOC_INDEX_LOCK:
+        entries = {fn: _DOC_INDEX.get(fn) for fn in dirty}
+    with _PHOTO_INDEX_LOCK:
+        names = set(_photo_index_state["names"])
+    old_names = _snapshot_state["photo_names"]
+    if not entries and names == old_names:
+        return
+
+    upserts, deletes = [], []
+    for fn, entry in entries.items():
+        if entry is None:
+            deletes.append((fn,))
+            continue
+        blob = None
+        if entry["raw"] is not None:
+            blob = zlib.compress(json.dumps(entry["raw"], ensure_ascii=False).encode("utf-8"), 1)
+        upserts.append((fn, entry["sig"][0], entry["sig"][1], int(entry["ok"]), blob))
 
+    try:
+        conn = _snapshot_conn()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM docs WHERE filename = ?", deletes)
+                conn.executemany("INSERT OR REPLACE INTO docs (filename, mtime_ns, size, ok, raw) "
+                                 "VALUES (?, ?, ?, ?, ?)", upserts)
+                conn.executemany("DELETE FROM photos WHERE name = ?", [(n,) for n in old_names - names])
+                conn.executemany("INSERT OR IGNORE INTO photos (name) VALUES (?)", [(n,) for n in names - old_names])
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ Could not write index snapshot: {e}")
+        with _SNAPSHOT_LOCK:
+            _snapshot_state["dirty"] |= dirty
+        return
+    _snapshot_state["photo_names"] = names
 
-@app.route("/")
-def index():
-    flagged_filter = request.args.get("flagged")
-    modified_filter = request.args.get("modified")
-    missed_filter = request.args.get("missed")
 
-    all_data = load_json_items()
+def _snapshot_docs_changed(doc_ids):
+    with _SNAPSHOT_LOCK:
+        _snapshot_state["dirty"].update(f"{d}.json" for d in doc_ids)
+    _snapshot_state["wake"].set()
 
-    count_flagged = sum(1 for item in all_data if item.get("Flagged") == "true")
-    count_modified = sum(1 for item in all_data if item.get("Modified"))
-    count_missed = sum(1 for item in all_data if item.get("Missed Photo") == "YES")
 
-    data = all_data
-    if flagged_filter == "true" and modified_filter == "true":
-        data = [item for item in data if item.get("Flagged") == "true" and item.get("Modified")]
-    elif flagged_filter == "true":
-        data = [item for item in data if item.get("Flagged") == "true"]
-    elif modified_filter == "true":
-        data = [item for item in data if item.get("Modified")]
+_doc_change_listeners.append(_snapshot_docs_changed)
 
-    if missed_filter == "true":
-        data = [item for item in data if item.get("Missed Photo") == "YES"]
 
-    return render_template(
-        "dashboard.html",
-        data=data,
-        warn_missing=True,
-        flagged_filter=flagged_filter,
-        modified_filter=modified_filter,
-        missed_filter=missed_filter,
-        count_flagged=count_flagged,
-        count_modified=count_modified,
-        count_missed=count_missed
-    )
+def _snapshot_worker():
+    """Revalidate the loaded snapshot, then keep it written back as the indexes change."""
+    if _snapshot_state["revalidating"]:
+        try:
+            changed = _refresh_doc_index()
+            _refresh_photo_index(force=True)
+            _index_scan_state["done"] = True
+            print(f"Index snapshot revalidated: {len(changed)} documents changed since it was written")
+        except Exception as e:
+            print(f"⚠️ Snapshot revalidation failed: {e}")
+        finally:
+            _snapshot_state["revalidating"] = False
+
+    wake = _snapshot_state["wake"]
+    while True:
+        wake.wait()
+        time.sleep(SNAPSHOT_DELAY)  # let a burst of saves land in one write
+        wake.clear()
+        _save_snapshot()
+
+
+def _ensure_snapshot_loaded():
+    with _SNAPSHOT_LOCK:
+        if _snapshot_state["loaded"]:
+            return
+        _snapshot_state["loaded"] = True
+    try:
+        started = time.time()
+        n = _load_snapshot()
+        if n:
+            print(f"Loaded index snapshot: {n} documents in {time.time() - started:.1f}s")
+            _snapshot_state["revalidating"] = True
+    except Exception as e:
+        print(f"⚠️ Index snapshot unusable, starting cold: {e}")
+    thread = threading.Thread(target=_snapshot_worker, name="index-snapshot", daemon=True)
+    _snapshot_state["thread"] = thread
+    thread.start()
+
+
+atexit.register(_save_snapshot)
+
+
+# ---------- SHARED STATE (MULTI-WORKER) ----------
+# Under serve_EL.py several worker processes serve the app, each with its own indexes
+# (warmed from the index snapshot above). Writes a worker makes (saves, toggles, bulk
+# updates, a DB cache reset) are appended to a change log in SHARED_STATE_PATH (local
+# SQLite, WAL) whose last seq is the shared generation counter. Before each request, and
+# on the watcher's poll tick, a worker compares it with the last seq it applied and
+# re-reads only the documents logged since; the change listeners then update its
+# aggregates, navigation views, search index and cached pages. Off unless EL_SHARED_STATE=1.
+_SHARED_LOCK = threading.Lock()
+_shared = {"conn": None, "pid": None, "seen": None}  # seen: last seq applied (None before the first check)
+
+
+def _shared_conn():
+    if _shared["conn"] is None or _shared["pid"] != os.getpid():  # never reuse a connection across fork()
+        os.makedirs(os.path.dirname(SHARED_STATE_PATH), exist_ok=True)
+        conn = sqlite3.connect(SHARED_STATE_PATH, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, key TEXT, pid INTEGER, at REAL
+            )
+        """)
+        conn.commit()
+        _shared.update(conn=conn, pid=os.getpid(), seen=None)
+    return _shared["conn"]
 
 
-@app.route("/review/<doc_id>")
-def review(doc_id):
-    json_path = os.path.join(JSON_DIR, f"{doc_id}.json")
-    if not os.path.exists(json_path):
-        return "Not found", 404
+def _shared_publish(kind: str, keys):
+    """Log a change ('doc' + doc_ids, or 'db_cache') for the other workers."""
+    if not SHARED_STATE or not keys:
+        return
+    try:
+        with _SHARED_LOCK:
+            conn = _shared_conn()
+            with conn:
+                conn.executemany("INSERT INTO changes (kind, key, pid, at) VALUES (?, ?, ?, ?)",
+                                 [(kind, key, os.getpid(), time.time()) for key in keys])
+                conn.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                             (SHARED_LOG_KEEP_ROWS,))
+    except Exception as e:
+        print(f"⚠️ Could not publish change to other workers: {e}")
 
-    m = JSON_NAME_RE.match(f"{doc_id}.json")
-    if not m:
-        return "Bad ID", 400
 
-    qr, building = m.groups()
-    with open(json_path, 'r', encoding='utf-8') as f:
-        loaded = json.load(f)
+def _shared_apply() -> int:
+    """Apply other workers' changes logged since the last call. Returns how many were applied."""
+    try:
+        with _SHARED_LOCK:
+            conn = _shared_conn()
+            last, first = conn.execute("SELECT COALESCE(MAX(seq), 0), COALESCE(MIN(seq), 0) FROM changes").fetchone()
+            seen = _shared["seen"]
+            if seen is None or last <= seen:
+                # first check: the index was (or is being) read from the files themselves
+                _shared["seen"] = last
+                return 0
+            rows = conn.execute("SELECT kind, key FROM changes WHERE seq > ? AND pid != ?",
+                                (seen, os.getpid())).fetchall()
+            _shared["seen"] = last
+    except Exception as e:
+        print(f"⚠️ Could not read changes from other workers: {e}")
+        return 0
+
+    if first > seen + 1:  # the log was pruned past what this worker had applied
+        _refresh_doc_index()
+    if any(kind == "db_cache" for kind, _key in rows):
+        _invalidate_db_caches()
+    for doc_id in {key for kind, key in rows if kind == "doc"}:
+        try:
+            _get_doc_versioned(doc_id)  # re-stats and re-reads the file if this worker's copy is stale
+        except ValueError:
+            pass
+    _inc("el_shared_changes_applied_total", len(rows))
+    return len(rows)
+
+
+# ---------- DASHBOARD QUERIES ----------
+def _sort_key(value):
+    """Digit-only values (QR codes, buildings, amperes) sort numerically, the rest case-insensitively."""
+    if isinstance(value, bool):
+        return (0, int(value), "")
+    text = str(value or "").strip()
+    if text.isdigit():
+        return (0, int(text), "")
+    return (1, 0, text.lower())
 
+
+def _order_items(items, args):
+    """
+    Apply DataTables order[i][column]/order[i][dir], last key first so the sort is stable.
+    Raises ValueError for a negative column index (it would silently pick a column from the end).
+    """
+    orders = []
+    i = 0
+    while f"order[{i}][column]" in args:
+        try:
+            index = int(args.get(f"order[{i}][column]"))
+        except ValueError:
+            index = None
+        if index is not None and index < 0:
+            raise ValueError(f"order[{i}][column] must be a column index >= 0")
+        col = DASHBOARD_COLUMNS[index] if index is not None and index < len(DASHBOARD_COLUMNS) else None
+        if col:
+            orders.append((col, args.get(f"order[{i}][dir]", "asc") == "desc"))
+        i += 1
+
+    data = list(items)
+    for col, descending in reversed(orders):
+        if col in STATUS_TESTS:
+            data.sort(key=lambda item: STATUS_TESTS[col](item), reverse=descending)
+        else:
+            data.sort(key=lambda item: _sort_key(item.get(col)), reverse=descending)
+    return data
+
+
+def _row_payload(item: dict) -> dict:
+    row = {col: item.get(col, "") for col in DASHBOARD_COLUMNS}
+    row.update({
+        "DT_RowId": item["doc_id"],
+        "doc_id": item["doc_id"],
+        "Modified": bool(item.get("Modified")),
+        "Photos Summary": item.get("Photos Summary", ""),
+        "Missing List": item.get("Missing List", ""),
+    })
+    return row
+
+
+# ---------- DASHBOARD AGGREGATES ----------
+# Per-building counters kept by delta: each document's contribution is remembered, and a
+# change (save, toggle, bulk update, file/photo event) subtracts the old one and adds the
+# new one. Built from the index on first use; badge counts and /api/progress then cost
+# O(buildings) instead of a pass over every asset.
+AGGREGATE_FIELDS = ("total", "approved", "flagged", "modified", "missed")
+
+_agg = {"ready": False, "docs": {}, "buildings": {}}  # doc_id -> (building, counts); building -> counts
+_AGG_LOCK = threading.Lock()
+
+
+def _agg_apply(doc_id: str, item):
+    """Replace doc_id's contribution with item's (None = no longer counted); caller holds _AGG_LOCK."""
+    old = _agg["docs"].pop(doc_id, None)
+    if old is not None:
+        building, vec = old
+        counts = _agg["buildings"][building]
+        for i, v in enumerate(vec):
+            counts[i] -= v
+        if counts[0] == 0:
+            del _agg["buildings"][building]
+    if item is None:
+        return
+    vec = (1,) + tuple(int(STATUS_TESTS[col](item)) for col in ("Approved", "Flagged", "Modified", "Missed Photo"))
+    _agg["docs"][doc_id] = (item["building"], vec)
+    counts = _agg["buildings"].setdefault(item["building"], [0] * len(AGGREGATE_FIELDS))
+    for i, v in enumerate(vec):
+        counts[i] += v
+
+
+def _agg_docs_changed(doc_ids):
+    with _AGG_LOCK:
+        if not _agg["ready"]:
+            return
+        for doc_id in doc_ids:
+            _agg_apply(doc_id, _index_item(f"{doc_id}.json"))
+
+
+def _dashboard_aggregates() -> dict:
+    """{building: {total, approved, flagged, modified, missed}} for every indexed, readable document."""
+    with _AGG_LOCK:
+        if not _agg["ready"]:
+            with _DOC_INDEX_LOCK:
+                order = list(_DOC_ORDER)
+            for fn in order:
+                _agg_apply(fn[:-5], _index_item(fn))
+            _agg["ready"] = True
+        return {b: dict(zip(AGGREGATE_FIELDS, counts)) for b, counts in _agg["buildings"].items()}
+
+
+def _dashboard_counts() -> dict:
+    """Badge counts for the whole corpus."""
+    totals = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    for counts in _dashboard_aggregates().values():
+        for k, v in counts.items():
+            totals[k] += v
+    return {"flagged": totals["flagged"], "modified": totals["modified"], "missed": totals["missed"]}
+
+
+_doc_change_listeners.append(_agg_docs_changed)
+
+
+# ---------- SEARCH INDEX ----------
+# In-process inverted index over the plate fields, so a panel can be looked up across every
+# building without loading the table. Each field value is split into lowercase alphanumeric
+# tokens (plus the joined form, "LP-2A" -> lp, 2a, lp2a); a posting maps token -> {doc_id:
+# field bitmask}. Query words are matched as prefixes through a sorted term list (bisect),
+# all words must match (AND), and "field:value" / 'field:"two words"' restricts a word to one
+# field. Built from the document index on first use and kept current per changed document.
+SEARCH_FIELDS = [  # (query name, item key, weight)
+    ("qr",        "qr_code",       3),
+    ("ubc",       "UBC Asset Tag", 3),
+    ("branch",    "Branch Panel",  3),
+    ("supply",    "Supply From",   2),
+    ("location",  "Location",      1),
+    ("building",  "building",      1),
+    ("ampere",    "Ampere",        1),
+    ("volts",     "Volts",         1),
+    ("attribute", "Attribute",     1),
+]
+SEARCH_LIMIT = 50
+SEARCH_MIN_PREFIX = 2  # shorter words match whole tokens only ("5" would otherwise hit every QR)
+
+# query name -> field bit; the full column name without spaces also works ("supplyfrom:")
+_SEARCH_FIELD_BITS = {alias: 1 << i for i, (name, key, _w) in enumerate(SEARCH_FIELDS)
+                      for alias in (name, key.replace(" ", "").replace("_", "").lower())}
+_SEARCH_ALL_FIELDS = (1 << len(SEARCH_FIELDS)) - 1
+# weight of a field bitmask = weight of its heaviest field
+_SEARCH_MASK_WEIGHT = [max([w for i, (_n, _k, w) in enumerate(SEARCH_FIELDS) if m >> i & 1] or [0])
+                       for m in range(_SEARCH_ALL_FIELDS + 1)]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_QUERY_RE = re.compile(r'(?:([A-Za-z_]+):)?(?:"([^"]*)"|(\S+))')
+
+_search = {"ready": False, "docs": {}, "postings": {}, "terms": []}  # docs: doc_id -> {token: mask}
+_SEARCH_LOCK = threading.Lock()
+
+
+def _search_tokens(value) -> list:
+    parts = _TOKEN_RE.findall(str(value or "").lower())
+    if len(parts) > 1:
+        parts.append("".join(parts))
+    return parts
+
+
+def _search_doc_tokens(doc_id: str) -> dict:
+    """{token: field bitmask} for an indexed document ({} if it is absent or unreadable)."""
+    filename = f"{doc_id}.json"
+    with _DOC_INDEX_LOCK:
+        entry = _DOC_INDEX.get(filename)
+    if not entry or not entry["ok"]:
+        return {}
+    qr, building = JSON_NAME_RE.match(filename).groups()
+    values = dict(entry["raw"].get("structured_data") or {}, qr_code=qr, building=building)
+    tokens = {}
+    for i, (_name, key, _w) in enumerate(SEARCH_FIELDS):
+        for token in _search_tokens(values.get(key)):
+            tokens[token] = tokens.get(token, 0) | (1 << i)
+    return tokens
+
+
+def _search_put(doc_id: str, tokens: dict):
+    """Replace doc_id's postings; caller holds _SEARCH_LOCK."""
+    postings, terms = _search["postings"], _search["terms"]
+    for token in _search["docs"].pop(doc_id, {}):
+        docs = postings[token]
+        del docs[doc_id]
+        if not docs:
+            del postings[token]
+            del terms[bisect.bisect_left(terms, token)]
+    if not tokens:
+        return
+    _search["docs"][doc_id] = tokens
+    for token, mask in tokens.items():
+        docs = postings.get(token)
+        if docs is None:
+            docs = postings[token] = {}
+            bisect.insort(terms, token)
+        docs[doc_id] = mask
+
+
+def _search_docs_changed(doc_ids):
+    with _SEARCH_LOCK:
+        if not _search["ready"]:
+            return
+        for doc_id in doc_ids:
+            _search_put(doc_id, _search_doc_tokens(doc_id))
+
+
+def _ensure_search_index():
+    with _SEARCH_LOCK:
+        if _search["ready"]:
+            return
+        with _DOC_INDEX_LOCK:
+            order = list(_DOC_ORDER)
+        postings = {}
+        for fn in order:
+            tokens = _search_doc_tokens(fn[:-5])
+            if tokens:
+                _search["docs"][fn[:-5]] = tokens
+                for token, mask in tokens.items():
+                    postings.setdefault(token, {})[fn[:-5]] = mask
+        _search["postings"] = postings
+        _search["terms"] = sorted(postings)
+        _search["ready"] = True
+
+
+def _parse_search_query(query: str) -> list:
+    """[(token, field bitmask), ...]; an unknown 'name:' prefix is searched as plain text."""
+    words = []
+    for m in _QUERY_RE.finditer(query or ""):
+        field, quoted, bare = m.group(1), m.group(2), m.group(3)
+        mask = _SEARCH_FIELD_BITS.get((field or "").lower(), 0) if field else _SEARCH_ALL_FIELDS
+        text = quoted if quoted is not None else bare
+        if field and not mask:
+            mask, text = _SEARCH_ALL_FIELDS, f"{field} {text}"
+        words.extend((token, mask) for token in _TOKEN_RE.findall(text.lower()))
+    return words
+
+
+def _search_docs(query: str, limit: int = SEARCH_LIMIT):
+    """
+    (total hits, [(doc_id, score), ...] best first, at most limit). Exact token matches score
+    twice a prefix match. The most selective word runs first; later words only look up the
+    remaining candidates when that is cheaper than walking their postings.
+    """
+    words = _parse_search_query(query)
+    if not words:
+        return 0, []
+    with _timed("search", phase="search"), _SEARCH_LOCK:
+        postings, terms = _search["postings"], _search["terms"]
+        plan = []
+        for token, allowed in words:  # terms are [a-z0-9]+, and "{" sorts after all of them
+            if len(token) < SEARCH_MIN_PREFIX:
+                matched = [token] if token in postings else []
+            else:
+                matched = terms[bisect.bisect_left(terms, token):bisect.bisect_left(terms, token + "{")]
+            plan.append((sum(len(postings[t]) for t in matched), token, allowed, matched))
+        plan.sort(key=lambda p: p[0])
+
+        scores = None
+        for _cost, token, allowed, matched in plan:
+            found = {}
+            for term in matched:
+                docs = postings[term]
+                if scores is None:
+                    pairs = docs.items()
+                elif len(scores) < len(docs):
+                    pairs = ((d, docs[d]) for d in scores if d in docs)
+                else:
+                    pairs = ((d, m) for d, m in docs.items() if d in scores)
+                boost = 2 if term == token else 1
+                for doc_id, mask in pairs:
+                    weight = _SEARCH_MASK_WEIGHT[mask & allowed] * boost
+                    if weight > found.get(doc_id, 0):
+                        found[doc_id] = weight
+            scores = found if scores is None else {d: scores[d] + w for d, w in found.items()}
+            if not scores:
+                return 0, []
+    return len(scores), heapq.nsmallest(limit, scores.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+_doc_change_listeners.append(_search_docs_changed)
+
+
+# ---------- FEEDER HIERARCHY ----------
+# The distribution tree per building: a plate is a panel known by its UBC Asset Tag and
+# Branch Panel names, fed by the panel named in its Supply From. Names are compared without
+# case, spaces or punctuation ("LP-2A" == "lp 2a"). The adjacency index (name -> panels,
+# Supply From name -> fed plates) and the orphan sets (Supply From names no panel in the
+# building carries) are built on first use and kept current per changed document, so
+# subtree and ancestry walks cost the size of their result rather than a corpus scan.
+_feeder = {
+    "ready": False,
+    "docs": {},       # doc_id -> (building, names, supply key, label, Supply From as typed)
+    "panels": {},     # (building, name key) -> {doc_id}
+    "children": {},   # (building, supply key) -> {doc_id}
+    "orphans": {},    # building -> {doc_id whose Supply From matches no panel}
+    "buildings": {},  # building -> {doc_id}
+}
+_FEEDER_LOCK = threading.RLock()
+
+
+def _feeder_key(value) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "", str(value or "")).upper()
+
+
+def _feeder_doc(doc_id: str):
+    """Hierarchy entry for an indexed document, or None if it is absent or unreadable."""
+    filename = f"{doc_id}.json"
+    with _DOC_INDEX_LOCK:
+        entry = _DOC_INDEX.get(filename)
+    if not entry or not entry["ok"]:
+        return None
+    building = JSON_NAME_RE.match(filename).group(2)
+    sd = entry["raw"].get("structured_data") or {}
+    ubc = str(sd.get("UBC Asset Tag") or "").strip()
+    branch = str(sd.get("Branch Panel") or "").strip()
+    supply = str(sd.get("Supply From") or "").strip()
+    names = frozenset(k for k in (_feeder_key(ubc), _feeder_key(branch)) if k)
+    return (building, names, _feeder_key(supply), ubc or branch, supply)
+
+
+def _feeder_put(doc_id: str, info):
+    """Replace doc_id's place in the hierarchy with info (None = drop it); caller holds _FEEDER_LOCK."""
+    panels, children, orphans = _feeder["panels"], _feeder["children"], _feeder["orphans"]
+
+    def discard(index, key, member):
+        members = index.get(key)
+        if members is not None:
+            members.discard(member)
+            if not members:
+                del index[key]
+
+    old = _feeder["docs"].pop(doc_id, None)
+    if old is not None:
+        building, names, supply = old[:3]
+        discard(_feeder["buildings"], building, doc_id)
+        discard(orphans, building, doc_id)
+        if supply:
+            discard(children, (building, supply), doc_id)
+        for name in names:
+            discard(panels, (building, name), doc_id)
+            if (building, name) not in panels and (building, name) in children:
+                orphans.setdefault(building, set()).update(children[(building, name)])
+    if info is None:
+        return
+
+    building, names, supply = info[:3]
+    _feeder["docs"][doc_id] = info
+    _feeder["buildings"].setdefault(building, set()).add(doc_id)
+    for name in names:
+        if (building, name) not in panels:
+            for child in children.get((building, name), ()):
+                discard(orphans, building, child)
+        panels.setdefault((building, name), set()).add(doc_id)
+    if supply:
+        children.setdefault((building, supply), set()).add(doc_id)
+        if (building, supply) not in panels:
+            orphans.setdefault(building, set()).add(doc_id)
+
+
+def _feeder_docs_changed(doc_ids):
+    with _FEEDER_LOCK:
+        if not _feeder["ready"]:
+            return
+        for doc_id in doc_ids:
+            _feeder_put(doc_id, _feeder_doc(doc_id))
+
+
+def _ensure_feeder_index():
+    with _FEEDER_LOCK:
+        if _feeder["ready"]:
+            return
+        with _DOC_INDEX_LOCK:
+            order = list(_DOC_ORDER)
+        for fn in order:
+            _feeder_put(fn[:-5], _feeder_doc(fn[:-5]))
+        _feeder["ready"] = True
+
+
+def _feeder_item(doc_id: str, **extra) -> dict:
+    building, _names, _supply, label, supply_from = _feeder["docs"][doc_id]
+    return dict({"doc_id": doc_id, "panel": label, "building": building, "supply_from": supply_from}, **extra)
+
+
+def _feeder_parents(doc_id: str) -> list:
+    """Panels feeding doc_id (more than one if several plates carry the name), sorted."""
+    building, _names, supply = _feeder["docs"][doc_id][:3]
+    return sorted(_feeder["panels"].get((building, supply), ())) if supply else []
+
+
+def _feeder_children(doc_id: str) -> list:
+    building, names = _feeder["docs"][doc_id][:2]
+    fed = set()
+    for name in names:
+        fed.update(_feeder["children"].get((building, name), ()))
+    return sorted(fed)
+
+
+def _feeder_ancestry(doc_id: str) -> dict:
+    """
+    Walk up from doc_id through Supply From. Where a name is carried by several plates the
+    first is followed and the name reported as ambiguous; the walk stops at a root (no Supply
+    From), an orphan (Supply From matches no panel) or a panel already on the path (cycle).
+    """
+    chain, seen, ambiguous = [], {doc_id}, []
+    current, cycle = doc_id, False
+    while True:
+        parents = _feeder_parents(current)
+        if not parents:
+            break
+        if len(parents) > 1:
+            ambiguous.append(_feeder["docs"][current][4])
+        parent = parents[0]
+        if parent in seen:
+            cycle = True
+            break
+        seen.add(parent)
+        chain.append(_feeder_item(parent))
+        current = parent
+    last = _feeder["docs"][current]
+    orphan = not cycle and bool(last[2]) and (last[0], last[2]) not in _feeder["panels"]
+    return {
+        "ancestors": chain,
+        "root": chain[-1]["doc_id"] if chain else doc_id,
+        "orphan": orphan,
+        "unresolved_supply": last[4] if orphan else "",
+        "cycle": cycle,
+        "ambiguous": ambiguous,
+    }
+
+
+def _feeder_subtree(doc_id: str, max_depth: int = 0) -> dict:
+    """Breadth-first walk down from doc_id (max_depth 0 = all levels); each plate appears once."""
+    found, seen, cycle = [], {doc_id}, False
+    pending = deque([(doc_id, 0)])
+    while pending:
+        current, depth = pending.popleft()
+        if max_depth and depth >= max_depth:
+            continue
+        for child in _feeder_children(current):
+            if child == doc_id:
+                cycle = True
+            if child in seen:
+                continue
+            seen.add(child)
+            found.append(_feeder_item(child, parent=current, depth=depth + 1))
+            pending.append((child, depth + 1))
+    return {"descendants": found, "cycle": cycle}
+
+
+def _feeder_cycles(building: str) -> list:
+    """Cycles in one building's tree (following the same parent as _feeder_ancestry); O(plates in it)."""
+    cycles, done = [], set()
+    for start in sorted(_feeder["buildings"].get(building, ())):
+        path, position, current = [], {}, start
+        while current is not None and current not in done and current not in position:
+            position[current] = len(path)
+            path.append(current)
+            parents = _feeder_parents(current)
+            current = parents[0] if parents else None
+        if current in position:
+            cycles.append(path[position[current]:])
+        done.update(path)
+    return cycles
+
+
+def _feeder_context(doc_id: str):
+    """Upstream chain and directly fed plates for the review page (None if doc_id is not indexed)."""
+    _ensure_feeder_index()
+    with _FEEDER_LOCK:
+        if doc_id not in _feeder["docs"]:
+            return None
+        return dict(_feeder_ancestry(doc_id),
+                    downstream=[_feeder_item(child) for child in _feeder_children(doc_id)])
+
+
+_doc_change_listeners.append(_feeder_docs_changed)
+
+
+# ---------- NAVIGATION ----------
+# Save & Next / Save & Prev walk the reviewer's filtered view of the dashboard. Each view
+# (one per filter combination, most recent NAV_VIEW_CACHE kept) is a sorted list of
+# filenames built once and then kept current per changed document, so a neighbour
+# lookup is a bisect rather than a directory listing and sort.
+NAV_VIEW_CACHE = 16
+
+_nav_views = OrderedDict()  # view key -> {"filters", "search", "order"}
+_NAV_LOCK = threading.RLock()
+
+
+def _index_item(filename: str):
+    """Dashboard item for an indexed document, or None if it is absent or unreadable."""
+    with _DOC_INDEX_LOCK:
+        entry = _DOC_INDEX.get(filename)
+    if not entry or not entry["ok"]:
+        return None
+    return _build_item(filename, entry["raw"])
+
+
+def _nav_matches(item, view) -> bool:
+    return item is not None and bool(filter_items([item], view["filters"], view["search"]))
+
+
+def _nav_view(dashboard_query: str) -> list:
+    """Sorted filenames in the view described by a dashboard query string ('?flagged=true&...')."""
+    args = dict(parse_qsl((dashboard_query or "").lstrip("?")))
+    filters = dashboard_filters(args)
+    search = (args.get("search") or "").strip().lower()
+    key = tuple(sorted((k, v) for k, v in filters.items() if k != "columns")) + (search,)
+
+    with _NAV_LOCK:
+        cached = key in _nav_views
+    _cache_result("nav_view", cached)
+    if not cached:
+        _refresh_doc_index()  # a new view starts from the full corpus (e.g. first save after a restart)
+
+    with _NAV_LOCK:
+        view = _nav_views.get(key)
+        if view is None:
+            # built under _NAV_LOCK so no change notification can slip in between
+            view = {"filters": filters, "search": search, "order": []}
+            with _DOC_INDEX_LOCK:
+                order = list(_DOC_ORDER)
+            view["order"] = [fn for fn in order if _nav_matches(_index_item(fn), view)]
+            _nav_views[key] = view
+            while len(_nav_views) > NAV_VIEW_CACHE:
+                _nav_views.popitem(last=False)
+        _nav_views.move_to_end(key)
+        return view["order"]
+
+
+def _nav_docs_changed(doc_ids):
+    with _NAV_LOCK:
+        if not _nav_views:
+            return
+        items = {f"{d}.json": _index_item(f"{d}.json") for d in doc_ids}
+        for view in _nav_views.values():
+            order = view["order"]
+            for fn, item in items.items():
+                i = bisect.bisect_left(order, fn)
+                present = i < len(order) and order[i] == fn
+                wanted = _nav_matches(item, view)
+                if wanted and not present:
+                    order.insert(i, fn)
+                elif present and not wanted:
+                    del order[i]
+
+
+_doc_change_listeners.append(_nav_docs_changed)
+
+
+def _neighbour_doc(doc_id: str, dashboard_query: str, step: int):
+    """
+    doc_id of the next (step=1) or previous (step=-1) document in the view. Works even if
+    doc_id itself has just left the view (e.g. unflagged while working through 'Flagged').
+    """
+    filename = f"{doc_id}.json"
+    with _NAV_LOCK:
+        order = _nav_view(dashboard_query)
+        if step > 0:
+            i = bisect.bisect_right(order, filename)
+            return order[i][:-5] if i < len(order) else None
+        i = bisect.bisect_left(order, filename)
+        return order[i - 1][:-5] if i > 0 else None
+
+
+# ---------- FOLDER WATCHER / LIVE UPDATES ----------
+# The OCR pipeline drops JSONs and photos into the share while people review. A watcher
+# thread feeds those changes into the document/photo indexes: with watchdog installed
+# (inotify / ReadDirectoryChangesW) each event is applied per file; otherwise the folder
+# mtimes are polled every WATCH_POLL_SECONDS and a changed folder is re-diffed. Either way
+# a full re-diff runs every WATCH_FULL_RESCAN_SECONDS, since network shares drop events
+# and in-place edits do not move the folder mtime. While the watcher runs, requests do not
+# rescan the folders themselves (see _refresh_indexes); review pages still stat their own
+# JSON. Index changes reach open dashboards as row updates over Server-Sent Events (/api/events).
+WATCH_POLL_SECONDS        = 2
+WATCH_DEBOUNCE_SECONDS    = 0.5
+WATCH_FULL_RESCAN_SECONDS = 60
+SSE_HEARTBEAT_SECONDS     = 15
+SSE_QUEUE_SIZE            = 1000   # pending change batches per client before it is told to reload
+
+_watch_events = queue.Queue()
+_watch_state = {"thread": None, "observer": None, "json_mtime": None, "last_full": 0.0}
+_WATCH_LOCK = threading.Lock()
+
+_event_subscribers = []
+_EVENTS_LOCK = threading.Lock()
+
+
+def _apply_watch_paths(paths: set):
+    """Bring the indexes up to date for the files the watcher reported."""
+    for path in paths:
+        folder, name = os.path.split(path)
+        if os.path.normcase(folder) == os.path.normcase(os.path.normpath(JSON_DIR)):
+            if _is_el_json(name):
+                try:
+                    _get_doc_versioned(name[:-5])  # stats the file; adds, re-reads or drops it
+                except Exception:
+                    pass  # unreadable/half-written: kept as a broken entry until it changes again
+        elif os.path.normcase(folder) == os.path.normcase(os.path.normpath(IMG_DIR)):
+            _photo_file_changed(name)
+
+
+def _watch_rescan(force: bool):
+    if _snapshot_state["revalidating"]:
+        return  # the snapshot worker is doing exactly this
+    try:
+        json_mtime = os.stat(JSON_DIR).st_mtime_ns
+    except OSError as e:
+        print(f"⚠️ JSON folder not reachable: {e}")
+        return
+    if force or json_mtime != _watch_state["json_mtime"]:
+        _refresh_doc_index()
+        _watch_state["json_mtime"] = json_mtime
+    _refresh_photo_index(force=force)
+
+
+def _watcher():
+    while True:
+        try:
+            # other workers' writes are picked up on the poll tick too, for this worker's SSE clients
+            polling = _watch_state["observer"] is None or SHARED_STATE
+            timeout = WATCH_POLL_SECONDS if polling else WATCH_FULL_RESCAN_SECONDS
+            try:
+                paths = {_watch_events.get(timeout=timeout)}
+            except queue.Empty:
+                paths = set()
+            if paths:
+                time.sleep(WATCH_DEBOUNCE_SECONDS)  # let a burst of writes settle
+                while True:
+                    try:
+                        paths.add(_watch_events.get_nowait())
+                    except queue.Empty:
+                        break
+                _apply_watch_paths(paths)
+            if SHARED_STATE:
+                _shared_apply()
+
+            full = time.time() - _watch_state["last_full"] >= WATCH_FULL_RESCAN_SECONDS
+            if full or _watch_state["observer"] is None:
+                _watch_rescan(force=full)
+                if full:
+                    _watch_state["last_full"] = time.time()
+        except Exception as e:
+            print(f"⚠️ Folder watcher: {e}")
+            time.sleep(WATCH_POLL_SECONDS)
+
+
+if FileSystemEventHandler is not None:
+    class _WatchHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            _watch_events.put(os.path.normpath(event.src_path))
+            dest = getattr(event, "dest_path", None)
+            if dest:
+                _watch_events.put(os.path.normpath(dest))
+
+
+def _ensure_watcher():
+    with _WATCH_LOCK:
+        thread = _watch_state["thread"]
+        if thread is not None and thread.is_alive():
+            return
+        if Observer is not None and _watch_state["observer"] is None:
+            try:
+                observer = Observer()
+                observer.schedule(_WatchHandler(), JSON_DIR, recursive=False)
+                observer.schedule(_WatchHandler(), IMG_DIR, recursive=False)
+                observer.daemon = True
+                observer.start()
+                _watch_state["observer"] = observer
+            except Exception as e:
+                print(f"⚠️ File events unavailable, polling folders instead: {e}")
+        _watch_state["last_full"] = time.time()
+        thread = threading.Thread(target=_watcher, name="folder-watch", daemon=True)
+        _watch_state["thread"] = thread
+        thread.start()
+
+
+def _publish_doc_changes(doc_ids):
+    with _EVENTS_LOCK:
+        subscribers = list(_event_subscribers)
+    for sub in subscribers:
+        try:
+            sub["queue"].put_nowait(set(doc_ids))
+        except queue.Full:
+            sub["overflow"] = True
+
+
+_doc_change_listeners.append(_publish_doc_changes)
+
+
+def _sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _event_stream(sub: dict):
+    try:
+        yield f"retry: {int(WATCH_POLL_SECONDS * 1000)}\n\n"
+        while True:
+            try:
+                doc_ids = sub["queue"].get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            while True:  # coalesce whatever else is already queued
+                try:
+                    doc_ids |= sub["queue"].get_nowait()
+                except queue.Empty:
+                    break
+            if sub["overflow"]:
+                sub["overflow"] = False
+                yield _sse("reload", {})
+                continue
+
+            rows, removed = [], []
+            for doc_id in sorted(doc_ids):
+                item = _index_item(f"{doc_id}.json")
+                if item is None:
+                    removed.append(doc_id)
+                else:
+                    rows.append(_row_payload(item))
+            yield _sse("rows", {"rows": rows, "removed": removed})
+    finally:
+        with _EVENTS_LOCK:
+            if sub in _event_subscribers:
+                _event_subscribers.remove(sub)
+
+
+@app.before_request
+def _start_watcher():
+    if _watch_state["thread"] is None:
+        _ensure_watcher()
+
+
+# ---------- CONDITIONAL / COMPRESSED RESPONSES ----------
+# Pages and summaries decorated with @_cached_page are rendered once per index generation,
+# filter combination and encoding, and cached compressed. Their ETag is a hash of the
+# rendered body, so worker processes (each with its own generation counter) agree on it
+# exactly when they would send the same bytes; If-None-Match then answers 304. @_compressed
+# only compresses (used where the body can never repeat, e.g. DataTables' 'draw' counter).
+RESPONSE_CACHE_SIZE = 64
+COMPRESS_MIN_BYTES  = 1024
+
+_response_cache = OrderedDict()  # (endpoint, query, encoding) -> (generation, etag, body, mimetype, encoding)
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def _negotiated_encoding() -> str:
+    offered = (["br"] if brotli is not None else []) + ["gzip"]
+    return request.accept_encodings.best_match(offered) or "identity"
+
+
+def _encode_body(body: bytes, encoding: str):
+    """Returns (body, encoding actually used); small bodies are not worth compressing."""
+    if encoding == "identity" or len(body) < COMPRESS_MIN_BYTES:
+        return body, "identity"
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6), "gzip"
+
+
+def _encoded_response(body: bytes, mimetype: str, encoding: str, etag: str = None) -> Response:
+    resp = Response(body, mimetype=mimetype)
+    resp.headers["Vary"] = "Accept-Encoding"
+    if encoding != "identity":
+        resp.headers["Content-Encoding"] = encoding
+    if etag:
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"  # always revalidate; a 304 is cheap
+    return resp
+
+
+def _cached_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        _refresh_indexes()
+        generation = _index_generation["value"]  # read first: a change during rendering forces a re-render
+        query = tuple(sorted(request.args.items(multi=True)))
+        encoding = _negotiated_encoding()
+        key = (request.endpoint, query, encoding)
+
+        with _RESPONSE_CACHE_LOCK:
+            cached = _response_cache.get(key)
+            if cached is not None and cached[0] == generation:
+                _response_cache.move_to_end(key)
+            else:
+                cached = None
+        _cache_result("response", cached is not None)
+
+        if cached is None:
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.direct_passthrough:
+                return resp
+            raw = resp.get_data()
+            body, used = _encode_body(raw, encoding)
+            cached = (generation, f"{hashlib.sha1(raw).hexdigest()}-{used}", body, resp.mimetype, used)
+            with _RESPONSE_CACHE_LOCK:
+                _response_cache[key] = cached
+                _response_cache.move_to_end(key)
+                while len(_response_cache) > RESPONSE_CACHE_SIZE:
+                    _response_cache.popitem(last=False)
+
+        _generation, etag, body, mimetype, used = cached
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            resp.headers["Vary"] = "Accept-Encoding"
+            return resp
+        return _encoded_response(body, mimetype, used, etag)
+    return wrapper
+
+
+def _compressed(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        resp = make_response(view(*args, **kwargs))
+        if resp.status_code != 200 or resp.direct_passthrough or "Content-Encoding" in resp.headers:
+            return resp
+        body, used = _encode_body(resp.get_data(), _negotiated_encoding())
+        return _encoded_response(body, resp.mimetype, used)
+    return wrapper
+
+
+# ---------- REVIEW PAGE CACHE ----------
+# Rendered review pages, least recently used dropped first once they hold more than
+# REVIEW_CACHE_MAX_BYTES of HTML. An entry is keyed by everything the page shows that can
+# change: the document's version (content hash), its photo files, the Attribute default
+# (for a blank Attribute) and its feeder links, so a stale page is a miss rather than served.
+# Save & Next / Prev queues the page it redirects to (when nothing is cached for it yet)
+# and the one beyond it for a single background worker, so a reviewer walking the list
+# lands on pages that are already rendered. The queue is deduplicated and keeps only the
+# REVIEW_WARM_QUEUE most recent requests, so a fast reviewer cannot pile up renders.
+REVIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024
+REVIEW_WARM_QUEUE      = 8
+
+_review_cache = OrderedDict()  # doc_id -> (key, html)
+_review_cache_state = {"bytes": 0}
+_REVIEW_CACHE_LOCK = threading.Lock()
+_review_warm = {"pending": OrderedDict(), "thread": None}  # pending: doc_id -> base URL
+_review_warm_wakeup = threading.Event()
+
+
+def _review_cache_get(doc_id: str, key: tuple):
+    with _REVIEW_CACHE_LOCK:
+        cached = _review_cache.get(doc_id)
+        hit = cached is not None and cached[0] == key
+        if hit:
+            _review_cache.move_to_end(doc_id)
+    _cache_result("review_page", hit)
+    return cached[1] if hit else None
+
+
+def _review_cache_drop(doc_id: str):
+    """Caller holds _REVIEW_CACHE_LOCK."""
+    cached = _review_cache.pop(doc_id, None)
+    if cached is not None:
+        _review_cache_state["bytes"] -= len(cached[1])
+
+
+def _review_cache_put(doc_id: str, key: tuple, html: str):
+    with _REVIEW_CACHE_LOCK:
+        _review_cache_drop(doc_id)
+        _review_cache[doc_id] = (key, html)
+        _review_cache_state["bytes"] += len(html)
+        while _review_cache_state["bytes"] > REVIEW_CACHE_MAX_BYTES and len(_review_cache) > 1:
+            _review_cache_drop(next(iter(_review_cache)))
+
+
+def _review_cache_docs_changed(doc_ids):
+    with _REVIEW_CACHE_LOCK:
+        for doc_id in doc_ids:
+            _review_cache_drop(doc_id)
+
+
+_doc_change_listeners.append(_review_cache_docs_changed)
+
+
+def _review_context(doc_id: str, qr: str, building: str, loaded: dict, doc_version: str,
+                    photos: tuple, photo_versions: tuple, default_attr: str, feeder) -> dict:
     data = loaded.get("structured_data", {}) or {}
-    keep_blank = ["UBC Asset Tag","Branch Panel","Ampere","Supply From","Volts","Location",
-                  "Attribute","Approved"]
-    for k in keep_blank:
+    for k in KEEP_BLANK:
         data.setdefault(k, "")
     data.setdefault("Flagged", "false")
 
-    if not (data.get("Attribute") or "").strip():
-        default_attr = _fetch_attribute_default_for_code("Electrical")
-        if default_attr:
-            data["Attribute"] = default_attr
+    if not (data.get("Attribute") or "").strip() and default_attr:
+        data["Attribute"] = default_attr
 
-    data["Description"] = _desc_from_ubc_or_branch(data.get("UBC Asset Tag"), data.get("Branch Panel"))
+    data["Description"] = description_for(data.get("UBC Asset Tag"), data.get("Branch Panel"))
 
     # Thumbnails
     images = {}
-    for tag in SEQ_SHOW:
-        filename = find_image(qr, building, tag)
-        images[tag] = {"exists": bool(filename), "url": url_for('serve_image', filename=filename) if filename else None}
+    for tag, filename, version in zip(SEQ_SHOW, photos, photo_versions):
+        images[tag] = {
+            "exists": bool(filename),
+            "url": url_for('serve_image', filename=filename, size='medium', v=version) if filename else None,
+            "thumb_url": url_for('serve_image', filename=filename, size='thumb', v=version) if filename else None,
+        }
 
     attribute_options = []  # dropdown not used in dashboard version, safe to leave empty
 
-    return render_template(
-        "review.html",
+    return dict(
         doc_id=doc_id,
+        doc_version=doc_version,
         qr_code=qr,
         building=building,
         asset_type=loaded.get("asset_type", ""),
         data=data,
         images=images,
-        attribute_options=attribute_options
+        attribute_options=attribute_options,
+        feeder=feeder,
+    )
+
+
+def _review_page(doc_id: str):
+    """Rendered review page for a valid doc_id (cached), or None if the document is gone."""
+    qr, building = JSON_NAME_RE.match(f"{doc_id}.json").groups()
+    entry = _current_doc_entry(doc_id)
+    if entry is None:
+        return None
+
+    _refresh_photo_index()
+    photos = tuple(find_image(qr, building, tag) for tag in SEQ_SHOW)
+    photo_versions = tuple(_photo_version(filename) for filename in photos)
+    sd = entry["raw"].get("structured_data") or {}
+    blank_attr = not str((sd.get("Attribute") if isinstance(sd, dict) else "") or "").strip()
+    default_attr = _fetch_attribute_default_for_code("Electrical") if blank_attr else ""
+    feeder = _feeder_context(doc_id)
+
+    key = (_doc_version(entry), photos, photo_versions, default_attr, repr(feeder))
+    html = _review_cache_get(doc_id, key)
+    if html is None:
+        context = _review_context(doc_id, qr, building, copy.deepcopy(entry["raw"]), _doc_version(entry),
+                                  photos, photo_versions, default_attr, feeder)
+        html = _render("review.html", **context)
+        _review_cache_put(doc_id, key, html)
+    return html
+
+
+def _review_warm_worker():
+    while True:
+        _review_warm_wakeup.wait()
+        while True:
+            with _REVIEW_CACHE_LOCK:
+                pending = _review_warm["pending"]
+                if not pending:
+                    _review_warm_wakeup.clear()
+                    break
+                doc_id, base_url = pending.popitem(last=False)
+            try:
+                with app.test_request_context("/", base_url=base_url):
+                    _review_page(doc_id)
+            except Exception as e:
+                print(f"⚠️ Could not prepare review page {doc_id}: {e}")
+
+
+def _warm_review_pages(doc_ids):
+    """Queue review pages that are not cached yet for the background render worker."""
+    base_url = request.url_root
+    with _REVIEW_CACHE_LOCK:
+        pending = _review_warm["pending"]
+        for doc_id in doc_ids:
+            if doc_id not in _review_cache:
+                pending[doc_id] = base_url
+                pending.move_to_end(doc_id)
+        while len(pending) > REVIEW_WARM_QUEUE:
+            pending.popitem(last=False)  # the reviewer has moved past these
+        if not pending:
+            return
+        thread = _review_warm["thread"]
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_review_warm_worker, name="review-warm", daemon=True)
+            _review_warm["thread"] = thread
+            thread.start()
+    _review_warm_wakeup.set()
+
+
+@app.route("/")
+@_cached_page
+def index():
+    flagged_filter = request.args.get("flagged")
+    modified_filter = request.args.get("modified")
+    missed_filter = request.args.get("missed")
+
+    # Rows are fetched page by page from /api/assets; the page only needs the badge counts.
+    counts = _dashboard_counts()
+
+    return _render(
+        "dashboard.html",
+        warn_missing=True,
+        flagged_filter=flagged_filter,
+        modified_filter=modified_filter,
+        missed_filter=missed_filter,
+        count_flagged=counts["flagged"],
+        count_modified=counts["modified"],
+        count_missed=counts["missed"]
     )
 
 
+@app.route("/api/assets")
+@_compressed
+def api_assets():
+    """
+    DataTables server-side processing: paging (start/length), global search (search[value]),
+    per-column filters and ordering. Also answers plain flagged/modified/missed/building/approved
+    query args, and returns the badge counts and building list for the filter bar.
+    """
+    args = request.args
+    all_data = load_json_items()
+    filters = dashboard_filters(args)
+
+    # Badge counts and the building dropdown reflect the whole corpus / the status filters,
+    # not the current building or search, as the old page did.
+    base = filter_items(all_data, {k: v for k, v in filters.items() if k in STATUS_TESTS})
+    buildings = sorted({item["building"] for item in base}, key=_sort_key)
+
+    data = filter_items(all_data, filters, args.get("search[value]", ""))
+    try:
+        data = _order_items(data, args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        start = max(int(args.get("start", 0)), 0)
+        length = int(args.get("length", 100))
+    except ValueError:
+        return jsonify({"error": "start/length must be integers"}), 400
+    page = data[start:] if length < 0 else data[start:start + length]
+
+    try:
+        draw = int(args.get("draw", 0))
+    except ValueError:
+        draw = 0
+
+    return jsonify({
+        "draw": draw,
+        "recordsTotal": len(all_data),
+        "recordsFiltered": len(data),
+        "data": [_row_payload(item) for item in page],
+        "counts": _dashboard_counts(),
+        "buildings": buildings,
+    })
+
+
+@app.route("/api/events")
+def dashboard_events():
+    """Server-Sent Events: 'rows' (changed rows as in /api/assets, plus removed doc_ids) or 'reload'."""
+    sub = {"queue": queue.Queue(maxsize=SSE_QUEUE_SIZE), "overflow": False}
+    with _EVENTS_LOCK:
+        _event_subscribers.append(sub)
+    return Response(_event_stream(sub), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/progress")
+@_cached_page
+def building_progress():
+    """Per-building review progress (approved / pending / flagged / missing photos), from the aggregates."""
+    buildings = []
+    for building, c in sorted(_dashboard_aggregates().items(), key=lambda kv: _sort_key(kv[0])):
+        buildings.append({
+            "building": building,
+            "total": c["total"],
+            "approved": c["approved"],
+            "pending": c["total"] - c["approved"],
+            "flagged": c["flagged"],
+            "modified": c["modified"],
+            "missed_photo": c["missed"],
+            "percent_approved": round(100.0 * c["approved"] / c["total"], 1) if c["total"] else 0.0,
+        })
+    totals = {k: sum(b[k] for b in buildings)
+              for k in ("total", "approved", "pending", "flagged", "modified", "missed_photo")}
+    totals["percent_approved"] = round(100.0 * totals["approved"] / totals["total"], 1) if totals["total"] else 0.0
+    return jsonify({"buildings": buildings, "totals": totals})
+
+
+@app.route("/api/search")
+def search_assets():
+    """
+    Ranked lookup across every building: ?q=<words>&limit=N. Words match as prefixes of any
+    plate field; field:value (qr, ubc, branch, supply, location, building, ampere, volts,
+    attribute) restricts a word to one field. Returns the total hit count and the best rows.
+    """
+    query = (request.args.get("q") or "").strip()
+    try:
+        limit = min(max(int(request.args.get("limit", SEARCH_LIMIT)), 1), 1000)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    _refresh_indexes()
+    _ensure_search_index()
+    total, hits = _search_docs(query, limit)
+    results = []
+    for doc_id, score in hits:
+        item = _index_item(f"{doc_id}.json")
+        if item is not None:
+            results.append(dict(_row_payload(item), score=score))
+    return jsonify({"query": query, "total": total, "results": results})
+
+
+@app.route("/api/feeders/<doc_id>/ancestry")
+def feeder_ancestry(doc_id):
+    """Panels feeding a plate, nearest first, up to the root; flags orphans, cycles and ambiguous names."""
+    _refresh_indexes()
+    _ensure_feeder_index()
+    with _FEEDER_LOCK:
+        if doc_id not in _feeder["docs"]:
+            return jsonify({"error": "not found"}), 404
+        return jsonify(dict(_feeder_item(doc_id), **_feeder_ancestry(doc_id)))
+
+
+@app.route("/api/feeders/<doc_id>/subtree")
+def feeder_subtree(doc_id):
+    """Every plate fed from this one, directly or not (?depth=N limits the levels), breadth first."""
+    try:
+        depth = max(int(request.args.get("depth", 0)), 0)
+    except ValueError:
+        return jsonify({"error": "depth must be an integer"}), 400
+    _refresh_indexes()
+    _ensure_feeder_index()
+    with _FEEDER_LOCK:
+        if doc_id not in _feeder["docs"]:
+            return jsonify({"error": "not found"}), 404
+        return jsonify(dict(_feeder_item(doc_id), **_feeder_subtree(doc_id, depth)))
+
+
+@app.route("/api/feeders/issues")
+def feeder_issues():
+    """Orphans (Supply From matches no panel) and cycles, for ?building=X or every building with any."""
+    building = (request.args.get("building") or "").strip()
+    _refresh_indexes()
+    _ensure_feeder_index()
+    with _FEEDER_LOCK:
+        buildings = [building] if building else sorted(_feeder["buildings"], key=_sort_key)
+        report = []
+        for b in buildings:
+            orphans = [_feeder_item(d) for d in sorted(_feeder["orphans"].get(b, ()))]
+            cycles = [[_feeder_item(d) for d in cycle] for cycle in _feeder_cycles(b)]
+            if orphans or cycles or building:
+                report.append({"building": b, "orphans": orphans, "cycles": cycles})
+    return jsonify({"buildings": report})
+
+
+@app.route("/export")
+def export_assets():
+    """
+    Stream the reviewed dataset as CSV (default) or ?format=xlsx, with the same filters as
+    the dashboard (flagged/modified/missed/building/approved/search, DataTables column
+    searches). Rows are built one at a time from the index, so 100k rows cost no more
+    memory than 100.
+    """
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        return "format must be csv or xlsx", 400
+    filters = dashboard_filters(request.args)
+    search = request.args.get("search") or request.args.get("search[value]", "")
+
+    _refresh_indexes()
+    with _DOC_INDEX_LOCK:
+        order = list(_DOC_ORDER)
+
+    def rows():
+        for fn in order:
+            item = _index_item(fn)
+            if item is None or not filter_items([item], filters, search):
+                continue
+            yield export_row(item["qr_code"], item["building"], item,
+                             bool(item.get("Modified")), item.get("Missed Photo") == "YES")
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if fmt == "csv":
+        return Response(
+            csv_chunks(rows()), mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="sdi_dataset_EL_{stamp}.csv"'},
+        )
+
+    # XLSX is a zip, so it cannot go out before it is complete: spool it (to disk past 8 MB)
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        write_xlsx(rows(), spool)
+    except RuntimeError as e:
+        spool.close()
+        return str(e), 501
+    spool.seek(0)
+    return send_file(spool, as_attachment=True, download_name=f"sdi_dataset_EL_{stamp}.xlsx",
+                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+@app.route("/review/<doc_id>")
+def review(doc_id):
+    m = JSON_NAME_RE.match(f"{doc_id}.json")
+    if not m:
+        return ("Bad ID", 400) if os.path.exists(os.path.join(JSON_DIR, f"{doc_id}.json")) else ("Not found", 404)
+
+    html = _review_page(doc_id)
+    if html is None:
+        return "Not found", 404
+    return html
+
+
 @app.route("/review/<doc_id>", methods=["POST"])
 def save_review(doc_id):
     json_path = os.path.join(JSON_DIR, f"{doc_id}.json")
-    if not os.path.exists(json_path):
-        return "Not found", 404
-
     m = JSON_NAME_RE.match(f"{doc_id}.json")
     if not m:
-        return "Bad ID", 400
+        return ("Bad ID", 400) if os.path.exists(json_path) else ("Not found", 404)
 
     qr, building = m.groups()
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        json_data = json.load(f)
-
-    structured = json_data.get("structured_data", {})
-    if not isinstance(structured, dict):
-        structured = {}
-        json_data["structured_data"] = structured
-
-    keep_blank = ["UBC Asset Tag","Branch Panel","Ampere","Supply From","Volts","Location",
-                  "Attribute","Approved"]
-    for k in keep_blank:
-        structured.setdefault(k, "")
-    structured.setdefault("Flagged", "false")
-
-    # Flagged
-    new_flagged = "true" if request.form.get("Flagged") == "on" else "false"
-    if structured.get("Flagged", "false") != new_flagged:
-        json_data["modified"] = True
-    structured["Flagged"] = new_flagged
-
-    # Update user-editable fields (skip derived)
-    skip_fields = {"Flagged","Description","Approved"}
-    for field in list(structured.keys()):
-        if field in skip_fields:
-            continue
-        form_value = request.form.get(field, "")
-        if structured.get(field, "") != form_value:
+    # a form from before versions existed has none: last write wins
+    expected_version = (request.form.get("doc_version") or "").strip() or None
+
+    def apply_form(json_data):
+        structured = json_data.get("structured_data", {})
+        if not isinstance(structured, dict):
+            structured = {}
+            json_data["structured_data"] = structured
+
+        for k in KEEP_BLANK:
+            structured.setdefault(k, "")
+        structured.setdefault("Flagged", "false")
+
+        # Flagged
+        new_flagged = "true" if request.form.get("Flagged") == "on" else "false"
+        if structured.get("Flagged", "false") != new_flagged:
             json_data["modified"] = True
-        structured[field] = form_value
+        structured["Flagged"] = new_flagged
 
-    # New fields
-    for field, form_value in request.form.items():
-        if field in {"Flagged","action","Description","dashboard_query"}:
-            continue
-        if field not in structured:
+        # Update user-editable fields (skip derived)
+        skip_fields = {"Flagged","Description","Approved"}
+        for field in list(structured.keys()):
+            if field in skip_fields:
+                continue
+            form_value = request.form.get(field, "")
+            if structured.get(field, "") != form_value:
+                json_data["modified"] = True
             structured[field] = form_value
-            json_data["modified"] = True
 
-    structured["Description"] = _desc_from_ubc_or_branch(structured.get("UBC Asset Tag"), structured.get("Branch Panel"))
+        # New fields
+        for field, form_value in request.form.items():
+            if field in {"Flagged","action","Description","dashboard_query","doc_version"}:
+                continue
+            if field not in structured:
+                structured[field] = form_value
+                json_data["modified"] = True
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=4)
+        structured["Description"] = description_for(structured.get("UBC Asset Tag"), structured.get("Branch Panel"))
 
-    # Sync to DB
-    try:
-        _sync_db_from_structured(qr, building, structured)
-    except Exception as e:
-        print(f"⚠️ DB sync failed (save_review): {e}")
+    status, json_data, _version = _update_doc(doc_id, apply_form, expected_version)
+    if status == "missing":
+        return "Not found", 404
+    if status == "conflict":
+        return ("This plate was changed by someone else after you opened it. "
+                "Go back and reload the page to see the current values."), 409
+    structured = json_data["structured_data"]
 
-    # Navigation
-    all_files = sorted(
-        f for f in os.listdir(JSON_DIR)
-        if f.endswith(".json") and not f.endswith("_raw_ocr.json") and JSON_NAME_RE.match(f)
-    )
-    current_name = f"{doc_id}.json"
-    try:
-        current_index = all_files.index(current_name)
-    except ValueError:
-        dash_q = request.form.get("dashboard_query", "")
-        if (dash_q or "").startswith("?"):
-            return redirect(url_for("index") + dash_q)
-        return redirect(url_for("index"))
+    # Sync to DB (write-behind)
+    _queue_db_rows([_db_row_from_structured(qr, building, structured)], "save_review")
 
+    # Navigation (within the dashboard view the reviewer came from)
+    dash_q = request.form.get("dashboard_query", "")
     action = request.form.get("action")
-    if action == "save_next" and current_index + 1 < len(all_files):
-        next_doc = all_files[current_index + 1][:-5]
-        return redirect(url_for("review", doc_id=next_doc))
-    elif action == "save_prev" and current_index > 0:
-        prev_doc = all_files[current_index - 1][:-5]
-        return redirect(url_for("review", doc_id=prev_doc))
+    if action in ("save_next", "save_prev"):
+        step = 1 if action == "save_next" else -1
+        target = _neighbour_doc(doc_id, dash_q, step)
+        if target:
+            beyond = _neighbour_doc(target, dash_q, step)
+            # the target races the redirect on a cold cache; beyond is ready by the time it is saved
+            _warm_review_pages([target] + ([beyond] if beyond else []))
+            return redirect(url_for("review", doc_id=target))
 
-    dash_q = request.form.get("dashboard_query", "")
     if (dash_q or "").startswith("?"):
         return redirect(url_for("index") + dash_q)
     return redirect(url_for("index"))
@@ -399,46 +2658,327 @@ def toggle_approved(doc_id):
     DB stores '1' if JSON == 'True', else ''.
     """
     json_path = os.path.join(JSON_DIR, f"{doc_id}.json")
-    if not os.path.exists(json_path):
-        return jsonify({"success": False, "error": "Not found"}), 404
-
     m = JSON_NAME_RE.match(f"{doc_id}.json")
     if not m:
+        if not os.path.exists(json_path):
+            return jsonify({"success": False, "error": "Not found"}), 404
         return jsonify({"success": False, "error": "Bad ID"}), 400
 
     qr, building = m.groups()
 
+    def toggle(json_data):
+        structured = json_data.get("structured_data", {})
+        if not isinstance(structured, dict):
+            structured = {}
+            json_data["structured_data"] = structured
+
+        cur_val = structured.get("Approved", "")
+        structured["Approved"] = "True" if cur_val == "" else ""
+
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            json_data = json.load(f)
+        status, json_data, version = _update_doc(doc_id, toggle)
+        if status == "missing":
+            return jsonify({"success": False, "error": "Not found"}), 404
+        structured = json_data["structured_data"]
 
+        _queue_db_rows([_db_row_from_structured(qr, building, structured)], "toggle_approved")
+
+        return jsonify({"success": True, "new_value": structured["Approved"], "version": version})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/bulk_update", methods=["POST"])
+def bulk_update():
+    """
+    Set Approved and/or Flagged (explicit values, not toggles) on many documents at once.
+    Body: {"doc_ids": [...]} or {"filter": {flagged, modified, missed, building, approved, search}},
+    plus {"set": {"Approved": true|false, "Flagged": true|false}}.
+    JSON files are written one by one through the document store; the sdi_dataset_EL rows
+    are journaled together and flushed in batched transactions. Returns per-document results.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"success": False, "error": "Expected a JSON object"}), 400
+    changes = body.get("set") or {}
+    if not isinstance(changes, dict):
+        return jsonify({"success": False, "error": "'set' must be an object"}), 400
+    changes = {k: v for k, v in changes.items() if k in ("Approved", "Flagged")}
+    bad = sorted(k for k, v in changes.items() if not isinstance(v, bool))
+    if bad:  # "false", 0 or "0" would otherwise read as true and approve the whole selection
+        return jsonify({"success": False,
+                        "error": f"'set' values must be true or false: {', '.join(bad)}"}), 400
+    if not changes:
+        return jsonify({"success": False, "error": "Nothing to set (expected 'Approved' and/or 'Flagged')"}), 400
+
+    if "doc_ids" in body:
+        doc_ids = body.get("doc_ids") or []
+        if not isinstance(doc_ids, list) or not all(isinstance(d, str) for d in doc_ids):
+            return jsonify({"success": False, "error": "'doc_ids' must be a list of strings"}), 400
+    elif isinstance(body.get("filter"), dict):
+        flt = body["filter"]
+        bad = sorted(k for k, v in flt.items() if v is not None and not isinstance(v, str))
+        if bad:
+            return jsonify({"success": False,
+                            "error": f"Filter values must be strings or null: {', '.join(map(str, bad))}"}), 400
+        doc_ids = [item["doc_id"] for item in
+                   filter_items(load_json_items(), dashboard_filters(flt), flt.get("search", ""))]
+    else:
+        return jsonify({"success": False, "error": "Expected 'doc_ids' or 'filter'"}), 400
+
+    def apply_changes(json_data):
         structured = json_data.get("structured_data", {})
         if not isinstance(structured, dict):
             structured = {}
             json_data["structured_data"] = structured
+        if "Approved" in changes:
+            structured["Approved"] = "True" if changes["Approved"] else ""
+        if "Flagged" in changes:
+            new_flagged = "true" if changes["Flagged"] else "false"
+            if structured.get("Flagged", "false") != new_flagged:
+                json_data["modified"] = True  # same rule as save_review
+            structured["Flagged"] = new_flagged
+
+    results, rows = [], []
+    for doc_id in doc_ids:
+        m = JSON_NAME_RE.match(f"{doc_id}.json")
+        if not m:
+            results.append({"doc_id": doc_id, "status": "error", "error": "Bad ID"})
+            continue
+        try:
+            status, json_data, version = _update_doc(doc_id, apply_changes)
+        except Exception as e:
+            results.append({"doc_id": doc_id, "status": "error", "error": str(e)})
+            continue
+        if status == "missing":
+            results.append({"doc_id": doc_id, "status": "error", "error": "Not found"})
+            continue
+        structured = json_data["structured_data"]
+        results.append({
+            "doc_id": doc_id, "status": status, "version": version,
+            "Approved": structured.get("Approved", ""), "Flagged": structured.get("Flagged", "false"),
+        })
+        rows.append(_db_row_from_structured(*m.groups(), structured))
+
+    _queue_db_rows(rows, "bulk_update")
+
+    return jsonify({
+        "success": all(r["status"] != "error" for r in results),
+        "updated": sum(1 for r in results if r["status"] == "saved"),
+        "unchanged": sum(1 for r in results if r["status"] == "unchanged"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "db_queued": len(rows),
+        "results": results,
+    })
+
+
+# ---------- DERIVATIVE CACHE ----------
+# Resized, orientation-corrected JPEGs in DERIVATIVE_DIR. The cache file name is derived
+# from the source name, mtime, size and variant, so a replaced photo never hits a stale copy.
+# File mtimes double as LRU access times. Concurrent requests for the same missing
+# derivative build it once (per-token lock); the others wait and serve the result.
+# photo_audit_EL.py and the other workers write to the same directory, so the byte tally
+# is recounted from disk when the directory changed (see _derivative_cache_bytes).
+_DERIVATIVE_LOCK = threading.Lock()
+_derivative_state = {"bytes": None, "dir_mtime": None, "counted_at": 0.0}
+_derivative_builds = {}  # token -> lock held while that derivative is being built
+
+
+def _image_version(st) -> str:
+    """The ?v= of a photo URL: changes when the photo is replaced under the same name."""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def _photo_version(filename):
+    if not filename:
+        return None
+    try:
+        with _timed("fs_stat", phase="stat"):
+            return _image_version(os.stat(os.path.join(IMG_DIR, filename)))
+    except OSError:
+        return None
 
-        cur_val = structured.get("Approved", "")
-        new_val = "True" if cur_val == "" else ""
-        structured["Approved"] = new_val
-        json_data["structured_data"] = structured
 
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=4)
+def _image_etag(filename: str, st, variant: str) -> str:
+    # also the derivative's cache name, shared with photo_audit_EL.py
+    return derivative_token(filename, st, variant)
+
+
+def _derivative_dir_mtime():
+    try:
+        return os.stat(DERIVATIVE_DIR).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _recount_derivatives():
+    """Reset the tally from disk; caller holds _DERIVATIVE_LOCK."""
+    mtime = _derivative_dir_mtime()  # before counting, so a change made meanwhile shows next time
+    _derivative_state.update(bytes=derivative_cache_bytes(DERIVATIVE_DIR), dir_mtime=mtime,
+                             counted_at=time.time())
+
+
+def _derivative_cache_bytes() -> int:
+    """
+    Bytes in DERIVATIVE_DIR; caller holds _DERIVATIVE_LOCK. A running tally of this process's
+    own builds, recounted from disk (at most every DERIVATIVE_RESCAN_SECONDS) once the
+    directory has changed since the last count.
+    """
+    state = _derivative_state
+    if state["bytes"] is None or (time.time() - state["counted_at"] >= DERIVATIVE_RESCAN_SECONDS
+                                  and _derivative_dir_mtime() != state["dir_mtime"]):
+        _recount_derivatives()
+    return state["bytes"]
+
+
+def _evict_derivatives():
+    """Drop least recently used derivatives until the cache is back under 90% of its cap."""
+    with _DERIVATIVE_LOCK:
+        if _derivative_cache_bytes() <= DERIVATIVE_MAX_BYTES:
+            return
+        mtime = _derivative_dir_mtime()
+        left = evict_derivatives(DERIVATIVE_DIR, DERIVATIVE_MAX_BYTES)  # counts every file, ours or not
+        _derivative_state.update(bytes=left, dir_mtime=mtime, counted_at=time.time())
+
 
+def _ensure_derivative(src_path: str, filename: str, variant: str):
+    """
+    Return the cached derivative for src_path (creating it if needed), or None if it
+    cannot be produced (no Pillow, unreadable image).
+    """
+    if Image is None:
+        return None
+    st = os.stat(src_path)
+    token = _image_etag(filename, st, variant)
+    dst = os.path.join(DERIVATIVE_DIR, token + ".jpg")
+    hit = os.path.exists(dst)
+    _cache_result("derivative", hit)
+    if hit:
+        try:
+            os.utime(dst)  # LRU touch
+        except OSError:
+            pass
+        return dst
+
+    with _DERIVATIVE_LOCK:
+        _derivative_cache_bytes()  # size the cache before adding to it
+        build_lock = _derivative_builds.setdefault(token, threading.Lock())
+
+    with build_lock:
+        if os.path.exists(dst):  # built by the request we waited for
+            return dst
+        edge = DERIVATIVE_SIZES[variant]
         try:
-            _sync_db_from_structured(qr, building, structured)
+            with _timed("derivative_build", phase="derivative", size=variant):
+                created = build_derivative(src_path, dst, edge)
         except Exception as e:
-            print(f"⚠️ DB sync failed (toggle_approved): {e}")
+            print(f"⚠️ Could not build {variant} for {filename}: {e}")
+            return None
+        finally:
+            with _DERIVATIVE_LOCK:
+                _derivative_builds.pop(token, None)
+
+        if created:  # not when another process (photo_audit_EL.py, a worker) wrote it meanwhile
+            with _DERIVATIVE_LOCK:
+                _derivative_state["bytes"] += os.path.getsize(dst)
+    _evict_derivatives()
+    return dst
+
+
+@app.before_request
+def _warm_indexes():
+    # first request after a restart: indexes come from the snapshot, revalidated in the background
+    if not _snapshot_state["loaded"]:
+        _ensure_snapshot_loaded()
+
+
+@app.before_request
+def _start_sync_worker():
+    # replays rows journaled before a restart; cheap no-op once the worker is running
+    if _sync_state["thread"] is None:
+        _ensure_sync_worker()
+
+
+@app.before_request
+def _apply_shared_changes():
+    # writes other worker processes made since this one last looked (serve_EL.py only)
+    if SHARED_STATE:
+        _shared_apply()
+
+
+@app.route("/api/sync_status")
+def sync_status():
+    """Write-behind queue depth and time since the last successful flush to sdi_dataset_EL."""
+    meta = _sync_meta()
+    last = float(meta["last_flush_at"]) if meta.get("last_flush_at") else None
+    return jsonify({
+        "pending": _journal_depth(),
+        "last_flush_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(last)) if last else None,
+        "seconds_since_last_flush": round(time.time() - last, 1) if last else None,
+        "last_error": meta.get("last_error") or _sync_state["last_error"],
+        "worker_alive": bool(_sync_state["thread"] and _sync_state["thread"].is_alive()),
+    })
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of the counters above plus a few index/queue gauges."""
+    with _DOC_INDEX_LOCK:
+        docs = len(_DOC_INDEX)
+    with _PHOTO_INDEX_LOCK:
+        photos = len(_photo_index_state["names"])
+    gauges = {
+        "el_documents_indexed": ("Documents in the in-memory index.", docs),
+        "el_photos_indexed": ("Photo files in the in-memory index.", photos),
+        "el_nav_views_cached": ("Navigation views held for Save & Next.", len(_nav_views)),
+        "el_search_terms": ("Distinct terms in the search index.", len(_search["terms"])),
+        "el_review_cache_bytes": ("HTML held in the review page cache.", _review_cache_state["bytes"]),
+        "el_sync_pending": ("Rows waiting in the write-behind journal.", _journal_depth()),
+    }
+    return Response(_render_metrics(gauges), mimetype="text/plain; version=0.0.4")
 
-        return jsonify({"success": True, "new_value": structured["Approved"]})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/admin/refresh_db_cache", methods=["POST"])
+def refresh_db_cache():
+    """Drop cached DB schema/Attribute defaults after the DB has been edited by hand."""
+    _invalidate_db_caches()
+    _shared_publish("db_cache", [""])
+    return jsonify({"success": True})
 
 
 @app.route("/images/<path:filename>")
 def serve_image(filename):
-    return send_from_directory(IMG_DIR, filename)
+    """
+    Full-size photo, or ?size=thumb|medium for a cached derivative.
+    Strong ETag + Last-Modified; conditional GETs get a 304. A URL carrying the photo's
+    current ?v= may be cached for IMAGE_MAX_AGE; any other must be revalidated (no-cache),
+    so a photo replaced under the same name is never shown stale.
+    """
+    variant = request.args.get("size", "")
+    if variant and variant not in DERIVATIVE_SIZES:
+        return "Bad size", 400
+
+    src_path = safe_join(IMG_DIR, filename)
+    if src_path is None or not os.path.isfile(src_path):
+        abort(404)
+    st = os.stat(src_path)
+    etag = _image_etag(filename, st, variant or "full")
+    versioned = request.args.get("v") == _image_version(st)
+    cache_kwargs = dict(etag=etag, last_modified=st.st_mtime, conditional=True,
+                        max_age=IMAGE_MAX_AGE if versioned else None)
+
+    resp = None
+    if variant:
+        dst = _ensure_derivative(src_path, filename, variant)
+        if dst:
+            resp = send_file(dst, mimetype="image/jpeg", **cache_kwargs)
+    if resp is None:
+        resp = send_from_directory(IMG_DIR, filename, **cache_kwargs)
+    if not versioned:
+        resp.cache_control.no_cache = True
+    return resp
 
 
 if __name__ == "__main__":
+    # development server (single process, reloader); serve_EL.py runs the production setup
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the EL review app and loader on a synthetic plate corpus.
+
+For each size N a corpus is generated under --workdir:
+- N "<QR>_EL_<Building>.json" documents (blank tags, flagged/approved/modified mixes),
+- photos "<QR> <Building> EL - <seq>.<ext>" with mixed extensions and missing tags,
+- a QR_codes.db with sdi_dataset_EL (partly pre-seeded) and the Attribute table.
+
+The app is pointed at it through the EL_* environment variables and driven with the
+Flask test client (load_json_items, index, /api/assets, /api/progress, /api/search,
+/api/feeders, review, save_review, a restart from the index snapshot); then
+verifica_sdi_dataset_EL.py runs end to end (full, incremental, --bulk). Each scenario
+reports latency percentiles, throughput and peak Python memory (tracemalloc, measured
+in a separate run so it does not skew latency).
+
+Usage:
+  python bench_EL.py                                  # 1k and 10k documents
+  python bench_EL.py --sizes 1000,10000,50000 --repeat 50 --json bench_results.json
+  python bench_EL.py --sizes 1000 --keep --workdir C:\\temp\\el_bench
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+import importlib.util
+from contextlib import contextmanager, redirect_stdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(HERE, "Asset Plate Reviewer_browser_EL_ver01.py")
+TEMPLATE_DIR = os.path.join(HERE, "review_asset_templates")
+
+PHOTO_EXTS = [".jpg", ".JPG", ".jpeg", ".png", ".PNG"]
+SDI_COLS = ["QR Code", "Building", "Description", "UBC Asset Tag", "Branch Panel", "Ampere",
+            "Supply From", "Volts", "Location", "Asset Group", "Attribute", "Approved"]
+
+
+# ---------- CORPUS ----------
+def generate_corpus(root: str, n: int, seed: int = 0, real_images: bool = False) -> dict:
+    """Write a synthetic corpus of n documents under root; returns its paths."""
+    rnd = random.Random(seed)
+    img_dir = os.path.join(root, "API Picture Test")
+    json_dir = os.path.join(img_dir, "Output_jason_api")
+    db_path = os.path.join(img_dir, "QR_codes.db")
+    os.makedirs(json_dir)
+
+    photo_bytes = b"\xff\xd8\xff\xe0synthetic\xff\xd9"
+    Image = None
+    if real_images:
+        from PIL import Image  # only needed to benchmark /images derivatives
+
+    buildings = [str(b) for b in range(100, 100 + max(5, n // 400))] + ["311-1", "402-2"]
+    panels = []
+    db_rows = []
+    for i in range(n):
+        qr = str(5000000 + i)
+        building = rnd.choice(buildings)
+        panel = f"{rnd.choice('LHPD')}{rnd.randint(1, 9)}-{i}"
+        ubc = "" if rnd.random() < 0.25 else f"EL-{building}-{i:05d}"
+        structured = {
+            "UBC Asset Tag": ubc,
+            "Branch Panel": panel,
+            "Ampere": rnd.choice(["", "100", "225", "400", "600"]),
+            "Supply From": rnd.choice(panels) if panels and rnd.random() < 0.9 else "MAIN",
+            "Volts": rnd.choice(["120/208", "347/600", "600"]),
+            "Location": f"Room {rnd.randint(1, 499)}",
+            "Attribute": "" if rnd.random() < 0.5 else "Panelboard",
+            "Approved": rnd.choice(["", "", "True", "1"]),
+            "Flagged": "true" if rnd.random() < 0.1 else "false",
+        }
+        panels.append(panel)
+        doc = {"asset_type": "el", "structured_data": structured, "modified": rnd.random() < 0.2}
+        with open(os.path.join(json_dir, f"{qr}_EL_{building}.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+
+        for seq in ("0", "1", "2"):
+            if rnd.random() < 0.12:
+                continue  # missing tag
+            exts = [rnd.choice(PHOTO_EXTS)]
+            if rnd.random() < 0.03:
+                exts.append(rnd.choice(PHOTO_EXTS))  # same photo saved twice
+            for ext in set(exts):
+                path = os.path.join(img_dir, f"{qr} {building} EL - {seq}{ext}")
+                if Image is not None:
+                    fmt = "PNG" if ext.lower() == ".png" else "JPEG"
+                    Image.new("RGB", (1200, 900), (i % 256, int(seq) * 90, 60)).save(path, fmt)
+                else:
+                    with open(path, "wb") as f:
+                        f.write(photo_bytes)
+
+        if rnd.random() < 0.5:
+            db_rows.append([qr, building, "", ubc, panel] + [""] * (len(SDI_COLS) - 5))
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(f'CREATE TABLE "sdi_dataset_EL" ({", ".join(f"{chr(34)}{c}{chr(34)} TEXT" for c in SDI_COLS)})')
+        conn.execute('CREATE TABLE "Attribute" ("Code" TEXT, "Attribute" TEXT)')
+        conn.execute('INSERT INTO "Attribute" VALUES (?, ?)', ("Electrical", "Panelboard"))
+        conn.executemany(f'INSERT INTO "sdi_dataset_EL" VALUES ({",".join("?" * len(SDI_COLS))})', db_rows)
+    conn.close()
+    return {"root": root, "json_dir": json_dir, "img_dir": img_dir, "db_path": db_path,
+            "cache_dir": os.path.join(root, "cache")}
+
+
+# ---------- MEASUREMENT ----------
+@contextmanager
+def quiet():
+    """Swallow the app's/loader's progress prints while timing."""
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def timed(fn, repeat: int) -> list:
+    times = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def peak_memory(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn(0)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(scenario: str, size: int, times: list, peak, per_op: int = 1, unit: str = "req/s") -> dict:
+    ordered = sorted(times)
+    mean = sum(ordered) / len(ordered)
+    return {
+        "scenario": scenario, "size": size, "runs": len(ordered),
+        "p50_ms": percentile(ordered, 50) * 1000, "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000, "mean_ms": mean * 1000,
+        "throughput": per_op / mean if mean else 0.0, "unit": unit,
+        "peak_mib": peak / 2**20 if peak is not None else None,
+    }
+
+
+# ---------- APP ----------
+_app_seq = iter(range(1, 1 << 30))
+
+
+def load_app(paths: dict):
+    """Import a fresh copy of the app (new, empty indexes) pointed at the corpus."""
+    os.environ.update(
+        EL_JSON_DIR=paths["json_dir"], EL_IMG_DIR=paths["img_dir"], EL_DB_PATH=paths["db_path"],
+        EL_CACHE_DIR=paths["cache_dir"], EL_TEMPLATE_DIR=TEMPLATE_DIR,
+        EL_STATIC_DIR=os.path.join(TEMPLATE_DIR, "static"),
+    )
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    name = f"el_bench_app_{next(_app_seq)}"
+    spec = importlib.util.spec_from_file_location(name, APP_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    with quiet():
+        spec.loader.exec_module(mod)
+    mod.app.testing = True
+    return mod
+
+
+def bench_app(paths: dict, n: int, repeat: int, memory: bool) -> list:
+    results = []
+    rnd = random.Random(1)
+
+    def run(scenario, fn, runs=repeat, per_op=1, unit="req/s", fresh_for_memory=None):
+        with quiet():
+            times = timed(fn, runs)
+            peak = None
+            if memory:
+                peak = peak_memory(fresh_for_memory() if fresh_for_memory else fn)
+        results.append(summarize(scenario, n, times, peak, per_op, unit))
+
+    def cold_load_with(mod_factory):
+        def fn(_i):
+            mod_factory().load_json_items()
+        return fn
+
+    # cold: first full read of the corpus by a new process (fresh module, empty cache dir)
+    shutil.rmtree(paths["cache_dir"], ignore_errors=True)
+    app = load_app(paths)
+    run("load_json_items (cold)", lambda _i: app.load_json_items(), runs=1, per_op=n, unit="docs/s",
+        fresh_for_memory=lambda: cold_load_with(lambda: load_app(paths)))
+    run("load_json_items (warm)", lambda _i: app.load_json_items(), per_op=n, unit="docs/s")
+
+    client = app.app.test_client()
+    doc_ids = [fn[:-5] for fn in sorted(os.listdir(paths["json_dir"])) if fn.endswith(".json")]
+
+    def get(url):
+        def fn(_i):
+            resp = client.get(url)
+            assert resp.status_code == 200, (url, resp.status_code)
+        return fn
+
+    run("GET /", get("/"))
+    run("GET /api/progress", get("/api/progress"))
+    run("GET /api/search (prefix)", get("/api/search?q=EL-10"))
+    run("GET /api/search (field)", get("/api/search?q=supply:L1+room"))
+    run("GET /api/assets (page 1)", get("/api/assets?draw=1&start=0&length=15"))
+    run("GET /api/assets (search+sort)",
+        get("/api/assets?draw=2&start=0&length=15&search[value]=EL-1&order[0][column]=2&order[0][dir]=desc"))
+    run("GET /api/assets (flagged, deep page)",
+        get(f"/api/assets?draw=3&flagged=true&start={max(0, n // 20 - 15)}&length=15"))
+
+    run("GET /api/feeders/<doc>/subtree", lambda _i: get(f"/api/feeders/{rnd.choice(doc_ids)}/subtree")(_i))
+    run("GET /api/feeders/<doc>/ancestry", lambda _i: get(f"/api/feeders/{rnd.choice(doc_ids)}/ancestry")(_i))
+
+    def review(_i):
+        resp = client.get(f"/review/{rnd.choice(doc_ids)}")
+        assert resp.status_code == 200, resp.status_code
+    run("GET /review/<doc>", review)
+    run("GET /review/<doc> (revisit)", get(f"/review/{doc_ids[0]}"))
+
+    def save(_i):
+        doc_id = rnd.choice(doc_ids)
+        with open(os.path.join(paths["json_dir"], f"{doc_id}.json"), encoding="utf-8") as f:
+            sd = json.load(f)["structured_data"]
+        form = {k: sd.get(k, "") for k in ("Attribute", "UBC Asset Tag", "Branch Panel", "Ampere",
+                                            "Supply From", "Volts", "Location")}
+        form["Location"] = f"Room {rnd.randint(500, 999)}"
+        form["action"] = "save_next"
+        resp = client.post(f"/review/{doc_id}", data=form)
+        assert resp.status_code == 302, resp.status_code  # no doc_version is sent, so never a conflict
+    run("POST /review/<doc> (save & next)", save)
+
+    # restart: a new process serving its first dashboard from the index snapshot
+    with quiet():
+        app._save_snapshot()
+
+    def restart(_i):
+        fresh = load_app(paths)
+        resp = fresh.app.test_client().get("/")
+        assert resp.status_code == 200, resp.status_code
+    run("restart + first GET / (snapshot)", restart, runs=max(1, min(repeat, 3)))
+    return results
+
+
+# ---------- LOADER ----------
+def bench_loader(paths: dict, n: int, memory: bool) -> list:
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import verifica_sdi_dataset_EL as loader
+    loader.DB_PATH, loader.JSON_DIR = paths["db_path"], paths["json_dir"]
+
+    results = []
+    for scenario, argv in [("loader --full", ["--full"]),
+                           ("loader (incremental, no changes)", []),
+                           ("loader --full --bulk", ["--full", "--bulk"])]:
+        with quiet():
+            times = timed(lambda _i: loader.main(argv), 1)
+            peak = peak_memory(lambda _i: loader.main(argv)) if memory else None
+        results.append(summarize(scenario, n, times, peak, per_op=n, unit="docs/s"))
+    return results
+
+
+# ---------- REPORT ----------
+def print_table(results: list):
+    header = f"{'scenario':<38} {'N':>7} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'throughput':>16} {'peak MiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        peak = f"{r['peak_mib']:.1f}" if r["peak_mib"] is not None else "-"
+        print(f"{r['scenario']:<38} {r['size']:>7} {r['runs']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['throughput']:>10.1f} {r['unit']:<5} {peak:>9}")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the EL review app and loader on a synthetic corpus")
+    ap.add_argument("--sizes", default="1000,10000", help="comma-separated corpus sizes (default: 1000,10000)")
+    ap.add_argument("--repeat", type=int, default=20, help="runs per request scenario (default: 20)")
+    ap.add_argument("--seed", type=int, default=0, help="corpus generator seed")
+    ap.add_argument("--workdir", help="where corpora are generated (default: a temp dir)")
+    ap.add_argument("--keep", action="store_true", help="keep the generated corpora")
+    ap.add_argument("--real-images", action="store_true", help="write real JPEG/PNG photos (needs Pillow)")
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory runs")
+    ap.add_argument("--skip-loader", action="store_true", help="only benchmark the app")
+    ap.add_argument("--json", help="also write the results to this JSON file")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="el_bench_")
+    results = []
+    try:
+        for n in sizes:
+            root = os.path.join(workdir, f"n{n}")
+            shutil.rmtree(root, ignore_errors=True)
+            started = time.perf_counter()
+            paths = generate_corpus(root, n, seed=args.seed, real_images=args.real_images)
+            print(f"Corpus of {n} documents generated in {time.perf_counter() - started:.1f}s ({root})")
+
+            results += bench_app(paths, n, args.repeat, not args.no_memory)
+            if not args.skip_loader:
+                results += bench_loader(paths, n, not args.no_memory)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming export of the reviewed EL plates (CSV / XLSX) for the CMMS upload.
+
+Callers hand in rows as a generator and they are written as they come: CSV in chunks
+(the review app streams them straight into the HTTP response), XLSX through openpyxl's
+write-only mode, so memory stays flat however many rows there are. Used by the review
+app's /export endpoint and by verifica_sdi_dataset_EL.py --export.
+
+Rows carry the sdi_dataset_EL columns, built by sdi_rules_EL like the app's and the
+loader's (UBC Asset Tag falls back to Branch Panel, Description from it, Attribute
+default), plus the review status columns. Callers pick the rows with the dashboard
+filters in sdi_rules_EL.
+"""
+
+import io
+import csv
+
+from sdi_rules_EL import SDI_COLUMNS, sdi_row
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # CSV export works without it
+    Workbook = None
+
+EXPORT_COLUMNS = SDI_COLUMNS + ["Flagged", "Modified", "Missed Photo"]
+
+CSV_CHUNK_ROWS = 500
+
+
+def export_row(qr: str, building: str, sd: dict, modified: bool, missed_photo: bool,
+               default_attr: str = "") -> dict:
+    """One export row from a document's structured_data and its review status."""
+    row = sdi_row(qr, building, sd, default_attr)
+    row["Approved"] = "True" if row["Approved"] == "True" else ""
+    row["Flagged"] = "true" if sd.get("Flagged") == "true" else "false"
+    row["Modified"] = "true" if modified else "false"
+    row["Missed Photo"] = "YES" if missed_photo else "NO"
+    return row
+
+
+def csv_chunks(rows, columns=EXPORT_COLUMNS):
+    """Yield the CSV (UTF-8 BOM first, so Excel opens it correctly) a few hundred rows at a time."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+    yield "\ufeff"
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+
+def write_xlsx(rows, target, columns=EXPORT_COLUMNS) -> int:
+    """Write rows to target (path or binary file object) as XLSX. Returns the row count."""
+    if Workbook is None:
+        raise RuntimeError("XLSX export needs openpyxl (pip install openpyxl)")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("sdi_dataset_EL")
+    ws.append(columns)
+    count = 0
+    for row in rows:
+        ws.append([row.get(col, "") for col in columns])
+        count += 1
+    wb.save(target)
+    return count
+
+
+def write_export(rows, path: str, columns=EXPORT_COLUMNS) -> int:
+    """Write rows to path as CSV or XLSX (by extension). Returns the row count."""
+    if path.lower().endswith(".xlsx"):
+        return write_xlsx(rows, path, columns)
+
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in csv_chunks(counted(), columns):
+            f.write(chunk)
+    return count
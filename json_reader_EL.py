@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent reader for the EL JSON documents ("<QR>_EL_<Building>.json").
+
+Reading from the S: share is dominated by per-file round-trips, so the opens run on a
+thread pool; parsing can optionally be pushed to a process pool. Records come back as a
+stream, in the same order as the filenames given, with at most a bounded number of files
+in flight. Used by the review app's document index and by verifica_sdi_dataset_EL.py.
+
+Errors are not printed here: each record carries the exception in `error` so callers
+keep reporting them in their own words (⚠️/❌ messages) and counting failures.
+"""
+
+import os
+import json
+import hashlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+DEFAULT_THREADS = 8
+
+# filename, qr, building, structured_data come first; doc is the whole parsed JSON,
+# sha256 the content hash (only when asked for), error the exception if the file failed.
+JsonRecord = namedtuple("JsonRecord", "filename qr building structured_data doc sha256 error")
+
+
+def _decode(blob: bytes):
+    return json.loads(blob.decode("utf-8"))
+
+
+def _load(path: str, with_hash: bool, parse_pool):
+    with open(path, "rb") as f:
+        blob = f.read()
+    digest = hashlib.sha256(blob).hexdigest() if with_hash else None
+    doc = parse_pool.submit(_decode, blob).result() if parse_pool else _decode(blob)
+    if not isinstance(doc, dict):
+        raise ValueError("JSON root is not an object")
+    return doc, digest
+
+
+def _record(filename: str, name_re, future) -> JsonRecord:
+    m = name_re.match(filename)
+    qr, building = m.groups() if m else ("", "")
+    try:
+        doc, digest = future.result()
+    except Exception as e:
+        return JsonRecord(filename, qr, building, None, None, None, e)
+    return JsonRecord(filename, qr, building, doc.get("structured_data") or {}, doc, digest, None)
+
+
+def iter_json_records(json_dir: str, filenames, name_re, threads: int = DEFAULT_THREADS,
+                      processes: int = 0, with_hash: bool = False):
+    """
+    Yield a JsonRecord per filename, in input order, while up to `threads` files are read
+    concurrently (and up to `threads * 4` are buffered). processes > 0 parses on a process
+    pool of that size. structured_data is returned as found; callers validate it.
+    """
+    filenames = iter(filenames)
+    threads = max(1, int(threads or 1))
+    read_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="json-read")
+    parse_pool = ProcessPoolExecutor(max_workers=processes) if processes and processes > 0 else None
+    pending = deque()
+
+    def submit_next() -> bool:
+        fn = next(filenames, None)
+        if fn is None:
+            return False
+        pending.append((fn, read_pool.submit(_load, os.path.join(json_dir, fn), with_hash, parse_pool)))
+        return True
+
+    try:
+        for _ in range(threads * 4):
+            if not submit_next():
+                break
+        while pending:
+            fn, future = pending.popleft()
+            submit_next()
+            yield _record(fn, name_re, future)
+    finally:
+        read_pool.shutdown(wait=True, cancel_futures=True)
+        if parse_pool:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
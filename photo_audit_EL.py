@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch audit of the EL plate photos ("<QR> <Building> EL - <seq>.<ext>" in IMG_DIR).
+
+Each photo is read once on a process pool, which records:
+- its dimensions and EXIF orientation,
+- a SHA-256 of the file,
+- a 64-bit perceptual hash (DCT pHash of the upright image).
+Each photo also gets the review app's orientation-corrected thumb/medium derivatives,
+written under the same cache names the app looks for. Results are kept in
+CACHE_DIR/photo_audit.db keyed by (mtime, size), so a rerun only reads new or changed
+photos (and ones whose derivatives were evicted). The derivative cache keeps the app's
+byte cap: after writing, the audit evicts least recently used derivatives the same way
+the app does.
+
+The report covers the whole corpus:
+- documents missing required (-1, -2) or optional (-0) photos,
+- photos with no JSON document,
+- unreadable images,
+- duplicates filed under more than one QR code/building: byte-identical files, and
+  near-identical photos (pHash distance <= --phash-distance).
+
+The derivative helpers (cache naming, building, eviction) are shared with the review app.
+
+Usage:
+  python photo_audit_EL.py                              # audit IMG_DIR, print the summary
+  python photo_audit_EL.py --processes 8 --report photo_audit.csv
+  python photo_audit_EL.py --no-derivatives --phash-distance 2
+"""
+
+import io
+import os
+import re
+import csv
+import math
+import time
+import sqlite3
+import hashlib
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # hashes and completeness still work; no dimensions, pHash or derivatives
+    Image = ImageOps = None
+
+# Same defaults and EL_* overrides as the review app
+IMG_DIR = os.environ.get("EL_IMG_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test")
+JSON_DIR = os.environ.get("EL_JSON_DIR", os.path.join(IMG_DIR, "Output_jason_api"))
+CACHE_DIR = os.environ.get("EL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".asset_plate_review_EL"))
+
+IMG_NAME_RE = re.compile(r"^(\d+) (\d+(?:-\d+)?) EL - (\d+)(\.[A-Za-z]+)$", re.IGNORECASE)
+JSON_NAME_RE = re.compile(r"^(\d+)_EL_(\d+(?:-\d+)?)\.json$")
+VALID_IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+REQUIRED_SEQS = ("1", "2")
+OPTIONAL_SEQS = ("0",)
+
+DERIVATIVE_SIZES = {"thumb": 240, "medium": 1600}  # longest edge, px (the app serves these)
+DERIVATIVE_QUALITY = 85
+DERIVATIVE_MAX_BYTES = 1024 * 1024 * 1024  # LRU eviction above this (app and audit alike)
+PHASH_DISTANCE = 4
+AUDIT_FORMAT = "1"
+
+
+# ---------- DERIVATIVES (shared with the review app) ----------
+def derivative_token(filename: str, st, variant: str) -> str:
+    """Cache key of a photo variant; changes whenever the photo is replaced."""
+    token = f"{filename}|{st.st_mtime_ns}|{st.st_size}|{variant}"
+    return hashlib.sha1(token.encode("utf-8")).hexdigest()
+
+
+def derivative_path(derivative_dir: str, filename: str, st, variant: str) -> str:
+    return os.path.join(derivative_dir, derivative_token(filename, st, variant) + ".jpg")
+
+
+def save_derivative(im, dst: str, edge: int) -> bool:
+    """
+    Write an upright RGB copy of im (already transposed) fitting edge x edge to dst, atomically.
+    Returns False if dst already existed (another builder got there first), so callers that
+    keep a byte count add each file once.
+    """
+    im = im.copy()
+    im.thumbnail((edge, edge))
+    if im.mode != "RGB":
+        im = im.convert("RGB")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.{id(im)}.tmp"
+    im.save(tmp, "JPEG", quality=DERIVATIVE_QUALITY, optimize=True)
+    created = not os.path.exists(dst)
+    os.replace(tmp, dst)
+    return created
+
+
+def build_derivative(src_path: str, dst: str, edge: int) -> bool:
+    """
+    Decode src_path at reduced scale, apply its EXIF orientation and save it to dst.
+    Returns whether this call created dst (see save_derivative).
+    """
+    with Image.open(src_path) as im:
+        im.draft("RGB", (edge, edge))  # cheap JPEG downscale while decoding
+        return save_derivative(ImageOps.exif_transpose(im), dst, edge)
+
+
+def derivative_cache_bytes(derivative_dir: str) -> int:
+    """Bytes in the derivative cache, counted from the files (whoever wrote them)."""
+    if not os.path.isdir(derivative_dir):
+        return 0
+    with os.scandir(derivative_dir) as it:
+        return sum(de.stat().st_size for de in it if de.is_file())
+
+
+def evict_derivatives(derivative_dir: str, max_bytes: int = DERIVATIVE_MAX_BYTES) -> int:
+    """
+    If the cache holds more than max_bytes, drop least recently used derivatives (file mtimes
+    are the access times) until it is back under 90% of it. Returns the bytes left.
+    """
+    if not os.path.isdir(derivative_dir):
+        return 0
+    with os.scandir(derivative_dir) as it:
+        files = sorted((de.stat().st_mtime, de.stat().st_size, de.path) for de in it if de.is_file())
+    total = sum(size for _mtime, size, _path in files)
+    if total <= max_bytes:
+        return total
+    target = int(max_bytes * 0.9)
+    for _mtime, size, path in files:
+        if total <= target:
+            break
+        if not path.endswith(".jpg"):  # another builder's file still being written
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
+
+
+# ---------- PERCEPTUAL HASH ----------
+_DCT_SIZE = 32
+_DCT_KEEP = 8
+_DCT_COS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)]
+            for u in range(_DCT_KEEP)]
+
+
+def phash(im) -> str:
+    """
+    64-bit pHash as 16 hex digits: 32x32 grayscale, separable DCT, top-left 8x8 low
+    frequencies (DC excluded from the median) compared with their median.
+    """
+    small = im.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    px = small.tobytes()  # one byte per pixel in mode L
+    rows = [px[y * _DCT_SIZE:(y + 1) * _DCT_SIZE] for y in range(_DCT_SIZE)]
+    # DCT along x for every row, keeping 8 coefficients, then along y for those 8 columns
+    row_coeffs = [[sum(c * v for c, v in zip(cos_u, row)) for cos_u in _DCT_COS] for row in rows]
+    coeffs = [sum(cos_v[y] * row_coeffs[y][u] for y in range(_DCT_SIZE))
+              for cos_v in _DCT_COS for u in range(_DCT_KEEP)]
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    bits = 0
+    for c in coeffs:
+        bits = (bits << 1) | (c > median)
+    return f"{bits:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+# ---------- PER-PHOTO WORK (process pool) ----------
+def audit_photo(task: tuple) -> dict:
+    """
+    Read one photo: hash it, measure it, pHash it and write missing derivatives.
+    task = (path, filename, mtime_ns, size, derivative_dir or None, {variant: dst path}).
+    """
+    path, filename, mtime_ns, size, derivative_dir, missing = task
+    result = {"name": filename, "mtime_ns": mtime_ns, "size": size, "width": None, "height": None,
+              "orientation": None, "sha256": None, "phash": None, "error": None}
+    try:
+        with open(path, "rb") as f:
+            blob = f.read()
+        result["sha256"] = hashlib.sha256(blob).hexdigest()
+        if Image is None:
+            return result
+        with Image.open(io.BytesIO(blob)) as im:
+            result["width"], result["height"] = im.size
+            result["orientation"] = int(im.getexif().get(0x0112, 1) or 1)
+            largest = max((DERIVATIVE_SIZES[v] for v in missing), default=256)
+            im.draft("RGB", (largest, largest))  # decode no larger than the biggest output needs
+            upright = ImageOps.exif_transpose(im)
+            result["phash"] = phash(upright)
+            for variant, dst in missing.items():
+                save_derivative(upright, dst, DERIVATIVE_SIZES[variant])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# ---------- METADATA STORE ----------
+def open_store(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS photos (
+            name TEXT PRIMARY KEY, qr TEXT, building TEXT, seq TEXT,
+            mtime_ns INTEGER, size INTEGER, width INTEGER, height INTEGER, orientation INTEGER,
+            sha256 TEXT, phash TEXT, error TEXT, audited_at REAL
+        )
+    """)
+    # results for another folder (or an older layout) are worthless; start over
+    want = {"format": AUDIT_FORMAT, "img_dir": IMG_DIR}
+    if dict(conn.execute("SELECT key, value FROM meta")) != want:
+        with conn:
+            conn.execute("DELETE FROM photos")
+            conn.execute("DELETE FROM meta")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", want.items())
+    return conn
+
+
+def list_photos(img_dir: str) -> dict:
+    """{filename: (qr, building, seq, mtime_ns, size)} for every EL photo in img_dir."""
+    photos = {}
+    with os.scandir(img_dir) as it:
+        for de in it:
+            m = IMG_NAME_RE.match(de.name)
+            if not m or m.group(4).lower() not in VALID_IMAGE_EXTS or not de.is_file():
+                continue
+            st = de.stat()
+            photos[de.name] = (m.group(1), m.group(2), m.group(3), st.st_mtime_ns, st.st_size)
+    return photos
+
+
+class _StatSig:
+    """The two stat fields derivative_token reads, from a listing instead of a second stat()."""
+    __slots__ = ("st_mtime_ns", "st_size")
+
+    def __init__(self, mtime_ns: int, size: int):
+        self.st_mtime_ns, self.st_size = mtime_ns, size
+
+
+def run_audit(conn: sqlite3.Connection, processes: int, derivatives: bool, force: bool = False) -> dict:
+    """Bring the store up to date with IMG_DIR. Returns counts (listed, audited, skipped, removed, errors)."""
+    photos = list_photos(IMG_DIR)
+    known = {name: (mtime_ns, size) for name, mtime_ns, size in
+             conn.execute("SELECT name, mtime_ns, size FROM photos WHERE error IS NULL")}
+    derivative_dir = os.path.join(CACHE_DIR, "derivatives") if derivatives and Image is not None else None
+
+    tasks = []
+    for name, (qr, building, seq, mtime_ns, size) in sorted(photos.items()):
+        missing = {}
+        if derivative_dir:
+            st = _StatSig(mtime_ns, size)
+            missing = {v: derivative_path(derivative_dir, name, st, v) for v in DERIVATIVE_SIZES}
+            missing = {v: p for v, p in missing.items() if not os.path.exists(p)}
+        if not force and known.get(name) == (mtime_ns, size) and not missing:
+            continue
+        tasks.append((os.path.join(IMG_DIR, name), name, mtime_ns, size, derivative_dir, missing))
+
+    removed = [(name,) for (name,) in conn.execute("SELECT name FROM photos") if name not in photos]
+    errors = 0
+    started = time.time()
+    workers = processes if processes and processes > 0 else (os.cpu_count() or 2)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for done, result in enumerate(pool.map(audit_photo, tasks, chunksize=16), 1):
+            qr, building, seq = photos[result["name"]][:3]
+            if result["error"]:
+                errors += 1
+                print(f"⚠️ {result['name']}: {result['error']}")
+            batch.append((result["name"], qr, building, seq, result["mtime_ns"], result["size"],
+                          result["width"], result["height"], result["orientation"],
+                          result["sha256"], result["phash"], result["error"], time.time()))
+            if len(batch) >= 500:
+                _store_results(conn, batch)
+                batch = []
+                print(f"   {done}/{len(tasks)} photos ({done / max(time.time() - started, 1e-6):.0f}/s)")
+        _store_results(conn, batch)
+    if derivative_dir:
+        evict_derivatives(derivative_dir)  # the new derivatives count toward the app's cap too
+    with conn:
+        conn.executemany("DELETE FROM photos WHERE name = ?", removed)
+    return {"listed": len(photos), "audited": len(tasks), "skipped": len(photos) - len(tasks),
+            "removed": len(removed), "errors": errors, "seconds": time.time() - started}
+
+
+def _store_results(conn: sqlite3.Connection, batch: list):
+    if batch:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO photos (name, qr, building, seq, mtime_ns, size, width, height, "
+                "orientation, sha256, phash, error, audited_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch)
+
+
+# ---------- REPORT ----------
+def _similar_pairs(entries: list, max_distance: int):
+    """
+    Pairs of (name, key, phash) within max_distance bits. The 64 bits are split into
+    max_distance + 1 bands; two hashes that close must agree on at least one band, so only
+    photos sharing a band value are compared.
+    """
+    bands = max_distance + 1
+    widths = [64 // bands + (1 if i < 64 % bands else 0) for i in range(bands)]
+    buckets = defaultdict(list)
+    for entry in entries:
+        bits, shift = int(entry[2], 16), 64
+        for i, width in enumerate(widths):
+            shift -= width
+            buckets[(i, (bits >> shift) & ((1 << width) - 1))].append(entry)
+    seen = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                pair = (a[0], b[0]) if a[0] < b[0] else (b[0], a[0])
+                if a[1] == b[1] or pair in seen:
+                    continue
+                seen.add(pair)
+                distance = hamming(a[2], b[2])
+                if distance <= max_distance:
+                    yield pair[0], pair[1], distance
+
+
+def build_report(conn: sqlite3.Connection, json_dir: str, max_distance: int) -> dict:
+    rows = conn.execute("SELECT name, qr, building, seq, sha256, phash, error FROM photos").fetchall()
+    docs = set()
+    if os.path.isdir(json_dir):
+        docs = {JSON_NAME_RE.match(fn).groups() for fn in os.listdir(json_dir) if JSON_NAME_RE.match(fn)}
+
+    seqs = defaultdict(set)
+    for _name, qr, building, seq, *_rest in rows:
+        seqs[(qr, building)].add(str(int(seq)))
+    missing = []
+    for key in sorted(docs):
+        have = seqs.get(key, set())
+        required = [s for s in REQUIRED_SEQS if s not in have]
+        optional = [s for s in OPTIONAL_SEQS if s not in have]
+        if required or optional:
+            missing.append((key, required, optional))
+    unmatched = sorted(r[0] for r in rows if (r[1], r[2]) not in docs)
+    unreadable = sorted((r[0], r[6]) for r in rows if r[6])
+
+    by_hash = defaultdict(list)
+    for name, qr, building, _seq, sha, _ph, error in rows:
+        if sha and not error:
+            by_hash[sha].append((name, (qr, building)))
+    exact = [sorted(n for n, _k in group) for group in by_hash.values()
+             if len({k for _n, k in group}) > 1]
+
+    exact_names = {n for group in exact for n in group}
+    entries = [(name, (qr, building), ph) for name, qr, building, _seq, _sha, ph, error in rows
+               if ph and not error and name not in exact_names]
+    similar = sorted(_similar_pairs(entries, max_distance), key=lambda p: (p[2], p[0]))
+
+    return {"photos": len(rows), "documents": len(docs), "missing": missing, "unmatched": unmatched,
+            "unreadable": unreadable, "exact": sorted(exact), "similar": similar}
+
+
+def write_report(path: str, report: dict):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["kind", "qr_code", "building", "photo", "detail", "group"])
+        for (qr, building), required, optional in report["missing"]:
+            if required:
+                w.writerow(["missing_required", qr, building, "", " ".join(f"-{s}" for s in required), ""])
+            if optional:
+                w.writerow(["missing_optional", qr, building, "", " ".join(f"-{s}" for s in optional), ""])
+        for name in report["unmatched"]:
+            m = IMG_NAME_RE.match(name)
+            w.writerow(["no_document", m.group(1), m.group(2), name, "", ""])
+        for name, error in report["unreadable"]:
+            m = IMG_NAME_RE.match(name)
+            w.writerow(["unreadable", m.group(1), m.group(2), name, error, ""])
+        for group_no, group in enumerate(report["exact"], 1):
+            for name in group:
+                m = IMG_NAME_RE.match(name)
+                w.writerow(["duplicate_exact", m.group(1), m.group(2), name, "", f"E{group_no}"])
+        for pair_no, (a, b, distance) in enumerate(report["similar"], 1):
+            for name in (a, b):
+                m = IMG_NAME_RE.match(name)
+                w.writerow(["duplicate_similar", m.group(1), m.group(2), name, f"distance {distance}", f"S{pair_no}"])
+
+
+def print_report(report: dict, sample: int):
+    required = sum(1 for _k, r, _o in report["missing"] if r)
+    print("—" * 60)
+    print(f"📷 Photos: {report['photos']} | documents: {report['documents']}")
+    print(f"   Missing required photos : {required} documents")
+    print(f"   Missing -0 (plate) only : {len(report['missing']) - required} documents")
+    print(f"   Photos with no document : {len(report['unmatched'])}")
+    print(f"   Unreadable images       : {len(report['unreadable'])}")
+    print(f"   Identical files, several assets : {len(report['exact'])} groups")
+    print(f"   Near-identical photos, different assets : {len(report['similar'])} pairs")
+    for group in report["exact"][:sample]:
+        print(f"   • identical: {' = '.join(group)}")
+    for a, b, distance in report["similar"][:sample]:
+        print(f"   • similar ({distance} bits): {a} ~ {b}")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Audit the EL plate photos: metadata, derivatives, completeness, duplicates.")
+    ap.add_argument("--processes", type=int, default=0, help="worker processes (default: one per CPU)")
+    ap.add_argument("--no-derivatives", action="store_true", help="do not write thumb/medium derivatives")
+    ap.add_argument("--force", action="store_true", help="re-read every photo, even unchanged ones")
+    ap.add_argument("--phash-distance", type=int, default=PHASH_DISTANCE,
+                    help=f"max differing pHash bits for near-duplicates (default: {PHASH_DISTANCE})")
+    ap.add_argument("--report", metavar="CSV", help="write every finding to this CSV")
+    ap.add_argument("--sample", type=int, default=10, help="duplicates to print (default: 10)")
+    ap.add_argument("--store", default=os.path.join(CACHE_DIR, "photo_audit.db"),
+                    help="metadata store (default: CACHE_DIR/photo_audit.db)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(IMG_DIR):
+        print(f"❌ Photo folder not found: {IMG_DIR}")
+        return
+    if Image is None:
+        print("⚠️ Pillow is not installed: recording hashes only (no dimensions, pHash or derivatives)")
+
+    conn = open_store(args.store)
+    try:
+        stats = run_audit(conn, args.processes, not args.no_derivatives, args.force)
+        print(f"✅ {stats['audited']} photos read, {stats['skipped']} unchanged skipped, "
+              f"{stats['removed']} removed, {stats['errors']} errors ({stats['seconds']:.1f}s)")
+        report = build_report(conn, JSON_DIR, args.phash_distance)
+    finally:
+        conn.close()
+    print_report(report, args.sample)
+    if args.report:
+        write_report(args.report, report)
+        print(f"📝 Full report in {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EL plate rules shared by the review app, export_EL.py and verifica_sdi_dataset_EL.py.
+
+- sdi_dataset_EL fields from a document's structured_data: UBC Asset Tag falls back to
+  Branch Panel, Description is "Panel - <that>" (or "Panel"), Attribute takes the default
+  for Electrical when blank.
+- Dashboard items and the dashboard's URL filters (flagged/modified/missed/building/
+  approved, DataTables column searches, free-text search), so /export, the review
+  navigation and the loader's --export select exactly the same documents.
+"""
+
+import re
+
+SDI_COLUMNS = [
+    "QR Code", "Building", "Description", "UBC Asset Tag", "Branch Panel", "Ampere",
+    "Supply From", "Volts", "Location", "Asset Group", "Attribute", "Approved",
+]
+
+# structured_data fields the dashboard and review page always show, even when absent
+KEEP_BLANK = ["UBC Asset Tag","Branch Panel","Ampere","Supply From","Volts","Location",
+              "Attribute","Approved"]
+
+# Table columns in the order dashboard.html lays them out (DataTables column index).
+DASHBOARD_COLUMNS = [
+    "qr_code", "building",
+    "UBC Asset Tag", "Branch Panel", "Ampere", "Supply From", "Volts", "Location", "Attribute", "Description",
+    "Approved", "Flagged", "Modified", "Missed Photo",
+]
+TEXT_COLUMNS = DASHBOARD_COLUMNS[:10]
+
+# Status columns: column -> predicate for a "true" filter value
+STATUS_TESTS = {
+    "Approved":     lambda item: item.get("Approved") == "True",
+    "Flagged":      lambda item: item.get("Flagged") == "true",
+    "Modified":     lambda item: bool(item.get("Modified")),
+    "Missed Photo": lambda item: item.get("Missed Photo") == "YES",
+}
+
+
+def description_for(ubc_tag: str, branch: str = "") -> str:
+    tag = (ubc_tag or "").strip() or (branch or "").strip()
+    return f"Panel - {tag}" if tag else "Panel"
+
+
+def sdi_row(qr: str, building: str, sd: dict, default_attr: str = "") -> dict:
+    """
+    sdi_dataset_EL row from structured_data. Approved is the JSON value as-is; each
+    caller maps it to its own target ('1' in the DB, 'True' in the export).
+    """
+    ubc_raw = (sd.get("UBC Asset Tag") or "").strip()
+    branch = (sd.get("Branch Panel") or "").strip()
+    ubc = ubc_raw or branch
+    return {
+        "QR Code": qr,
+        "Building": building,
+        "Description": description_for(ubc),
+        "UBC Asset Tag": ubc,
+        "Branch Panel": branch,
+        "Ampere": (sd.get("Ampere") or "").strip(),
+        "Supply From": (sd.get("Supply From") or "").strip(),
+        "Volts": (sd.get("Volts") or "").strip(),
+        "Location": (sd.get("Location") or "").strip(),
+        "Asset Group": (sd.get("Asset Group") or "").strip(),
+        "Attribute": (sd.get("Attribute") or "").strip() or default_attr,
+        "Approved": (sd.get("Approved") or "").strip(),
+    }
+
+
+def dashboard_item(qr: str, building: str, sd: dict, modified, missed_photo: bool,
+                   default_attr: str = "") -> dict:
+    """A document as the dashboard lists (and filters) it: its structured_data plus status columns."""
+    data = dict(sd or {})
+    for k in KEEP_BLANK:
+        data.setdefault(k, "")
+    data.setdefault("Flagged", "false")
+    if not (data.get("Attribute") or "").strip() and default_attr:
+        data["Attribute"] = default_attr
+    data["Description"] = description_for(data.get("UBC Asset Tag"), data.get("Branch Panel"))
+    return {
+        "qr_code": qr,
+        "building": building,
+        "Flagged": data.get("Flagged", "false"),
+        "Approved": data.get("Approved", ""),
+        "Modified": modified,
+        "Missed Photo": "YES" if missed_photo else "NO",
+        **data
+    }
+
+
+def plain_search(value: str) -> str:
+    """Column searches saved by older dashboards were anchored regexes ('^x$'); keep the literal."""
+    value = (value or "").strip()
+    if value.startswith("^") and value.endswith("$"):
+        value = re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def is_true(value: str) -> bool:
+    return (value or "").strip().lower() in ("true", "yes", "1")
+
+
+def dashboard_filters(args) -> dict:
+    """
+    Collect dashboard filters from query args: the page's own flagged/modified/missed/
+    building/approved args plus DataTables per-column searches (columns[i][search][value]).
+    """
+    filters = {
+        "Flagged": "true" if args.get("flagged") == "true" else "",
+        "Modified": "true" if args.get("modified") == "true" else "",
+        "Missed Photo": "true" if args.get("missed") == "true" else "",
+        "building": plain_search(args.get("building", "")),
+        "Approved": plain_search(args.get("approved", "")),
+        "columns": {},
+    }
+    for i, col in enumerate(DASHBOARD_COLUMNS):
+        value = plain_search(args.get(f"columns[{i}][search][value]", ""))
+        if not value:
+            continue
+        if col in ("building", "Approved", "Flagged", "Modified", "Missed Photo"):
+            filters[col] = value
+        else:
+            filters["columns"][col] = value.lower()
+    return filters
+
+
+def filter_items(items, filters: dict, search: str = ""):
+    data = items
+    for col, test in STATUS_TESTS.items():
+        value = filters.get(col)
+        if value:
+            want = is_true(value)
+            data = [item for item in data if test(item) == want]
+    if filters.get("building"):
+        data = [item for item in data if item.get("building") == filters["building"]]
+    for col, needle in filters.get("columns", {}).items():
+        data = [item for item in data if needle in str(item.get(col, "")).lower()]
+
+    search = (search or "").strip().lower()
+    if search:
+        data = [item for item in data
+                if any(search in str(item.get(col, "")).lower() for col in TEXT_COLUMNS)]
+    return data
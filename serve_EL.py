@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Production entry point for the EL review app: several worker processes, each with a
+pool of threads, instead of the single-process debug server in the app's __main__.
+
+Workers share their state through files in the app's cache folder (EL_CACHE_DIR):
+- the index snapshot warms each new worker's document/photo indexes,
+- the shared change log (EL_SHARED_STATE=1, set here) carries every save, toggle, bulk
+  update and DB cache reset to the other workers before their next request,
+- the write-behind journal is flushed by one worker at a time (lease).
+
+Servers, in order of preference:
+- gunicorn (Linux/macOS): --workers processes x --threads threads,
+- waitress (Windows, no fork): one process with --workers x --threads threads,
+- otherwise Werkzeug's threaded server, without the debugger or reloader.
+
+Every open dashboard holds one thread for its live-update stream (/api/events), so size
+--threads for the number of reviewers plus headroom.
+
+Usage:
+  python serve_EL.py                                  # 0.0.0.0:5000, 4 workers x 8 threads
+  python serve_EL.py --workers 2 --threads 16 --port 8000
+  gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 serve_EL:app
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+
+os.environ.setdefault("EL_SHARED_STATE", "1")  # read by the app module at import
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(HERE, "Asset Plate Reviewer_browser_EL_ver01.py")
+
+
+def load_app_module():
+    """Import the app module (its file name has spaces, so it cannot be imported by name)."""
+    sys.path.insert(0, HERE)
+    spec = importlib.util.spec_from_file_location("asset_plate_reviewer_el", APP_FILE)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+app = load_app_module().app
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows, or not installed
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+
+def run_gunicorn(host: str, port: int, workers: int, threads: int, timeout: int):
+    class ELApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", timeout)
+            self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return app
+
+    ELApplication().run()
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Serve the EL review app with several workers.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=4, help="worker processes (default: 4)")
+    ap.add_argument("--threads", type=int, default=8, help="threads per worker (default: 8)")
+    ap.add_argument("--timeout", type=int, default=120,
+                    help="seconds before gunicorn restarts a stuck worker (default: 120)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if BaseApplication is not None and os.name != "nt":
+        print(f"Serving on {args.host}:{args.port} with gunicorn: {args.workers} workers x {args.threads} threads")
+        run_gunicorn(args.host, args.port, args.workers, args.threads, args.timeout)
+    elif waitress is not None:
+        threads = args.workers * args.threads
+        print(f"Serving on {args.host}:{args.port} with waitress: 1 process x {threads} threads")
+        waitress.serve(app, host=args.host, port=args.port, threads=threads)
+    else:
+        print("⚠️ Neither gunicorn nor waitress is installed (pip install gunicorn / waitress); "
+              "using Werkzeug's threaded server")
+        app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,26 +10,60 @@ Melhorias:
 - Description = "Panel - <UBC Asset Tag ou Branch Panel>"; se ambos vazios -> "Panel".
 - Attribute default via tabela Attribute onde Code = "Electrical".
 - Relatório final com contagem de JSONs processados e amostra da tabela.
+- Modo --bulk: todas as linhas vão para uma tabela temporária (executemany) e são
+  aplicadas com UPDATE/INSERT set-based numa única transação (ou INSERT ... ON CONFLICT
+  se existir índice UNIQUE em ("QR Code","Building"); --create-unique-index tenta criá-lo).
+- Carga incremental: a tabela _loader_manifest_EL (no próprio QR_codes.db) guarda
+  arquivo, mtime, tamanho e SHA-256 do último JSON aplicado. Só arquivos novos ou
+  alterados são processados; --full força a recarga completa.
+- Leitura concorrente (json_reader_EL): --workers threads abrem os arquivos em paralelo
+  (o share S: é dominado por latência por arquivo); --parse-processes > 0 faz o parse
+  num pool de processos. A ordem de processamento continua a dos nomes ordenados.
+- Exportação (--export arquivo.csv|.xlsx): grava as linhas revisadas (colunas COLS +
+  Flagged/Modified/Missed Photo) direto dos JSONs, em streaming (memória constante),
+  com os mesmos filtros da URL do dashboard (--filtro "flagged=true&building=101").
+  Não altera o DB.
+- Reconciliação (--reconciliar): compara JSONs e sdi_dataset_EL por ("QR Code","Building")
+  e relata o que só existe num dos lados e os campos divergentes (UBC/Description
+  derivados do JSON contra o que está gravado no DB; Approved "1"/"True" equivalentes).
+  Sem --aplicar é só relatório;
+  com --aplicar grava apenas as linhas novas/divergentes (set-based, 1 transação).
 
 Uso (PowerShell):
   python "S:\\MaintOpsPlan\\AssetMgt\\Asset Management Process\\Database\\8. New Assets\\Git_control\\Asset_plate_review_EL\\load_el_json_to_sdi_dataset_EL_update_insert_v2.py"
+  python verifica_sdi_dataset_EL.py --bulk [--create-unique-index]
+  python verifica_sdi_dataset_EL.py --full
+  python verifica_sdi_dataset_EL.py --export revisados.xlsx --filtro "approved=True&building=101"
+  python verifica_sdi_dataset_EL.py --reconciliar [--relatorio divergencias.csv] [--aplicar]
 """
 
 import os
 import re
-import json
+import csv
+import time
 import sqlite3
+import argparse
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+from urllib.parse import parse_qsl
 
-# === PATHS (ajuste se necessário) ===
-DB_PATH  = r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\QR_codes.db"
-JSON_DIR = r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\Output_jason_api"
+from json_reader_EL import iter_json_records, DEFAULT_THREADS
+from export_EL import export_row, write_export
+from sdi_rules_EL import sdi_row, dashboard_item, dashboard_filters, filter_items
+
+# === PATHS (ajuste se necessário; EL_DB_PATH / EL_JSON_DIR no ambiente sobrepõem) ===
+DB_PATH  = os.environ.get("EL_DB_PATH", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\QR_codes.db")
+JSON_DIR = os.environ.get("EL_JSON_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test\Output_jason_api")
+IMG_DIR  = os.environ.get("EL_IMG_DIR", r"S:\MaintOpsPlan\AssetMgt\Asset Management Process\Database\8. New Assets\Git_control\API Picture Test")
 
 TABLE = "sdi_dataset_EL"
 # Padrão de nome: <QR>_EL_<Building>.json
 JSON_NAME_RE = re.compile(r"^(\d+)_EL_(\d+(?:-\d+)?)\.json$", re.IGNORECASE)
 
+# Fotos "<QR> <Building> EL - <seq>.<ext>"; sem as seqs obrigatórias -> Missed Photo = YES
+IMG_NAME_RE = re.compile(r"^(\d+) (\d+(?:-\d+)?) EL - (\d+)\.(jpe?g|png)$", re.IGNORECASE)
+REQUIRED_PHOTO_SEQS = ("1", "2")
+
 # Colunas esperadas na tabela (conforme seu PRAGMA)
 COLS = [
     "QR Code",
@@ -46,10 +80,6 @@ COLS = [
     "Approved",
 ]
 
-def compute_description(ubc_or_branch: str) -> str:
-    tag = (ubc_or_branch or "").strip()
-    return f"Panel - {tag}" if tag else "Panel"
-
 def fetch_default_attribute(conn: sqlite3.Connection) -> str:
     """
     Busca na tabela Attribute o valor da coluna 'Attribute' quando Code = 'Electrical'
@@ -104,33 +134,156 @@ def upsert_row_update_then_insert(conn: sqlite3.Connection, row: Dict[str, Any],
     conn.execute(sql_ins, [row.get(c, "") for c in ins_cols])
     return "inserted"
 
+KEY_COLS = ("QR Code", "Building")
+UNIQUE_INDEX_NAME = "ux_sdi_dataset_EL_qr_building"
+STAGE_TABLE = "_stage_sdi_el"
+
+def has_unique_key_index(conn: sqlite3.Connection) -> bool:
+    """
+    True se existir um índice UNIQUE exatamente em ("QR Code","Building") na tabela alvo.
+    """
+    for idx in conn.execute(f'PRAGMA index_list("{TABLE}")').fetchall():
+        if not idx[2]:  # idx[2] = unique
+            continue
+        cols = [r[2] for r in conn.execute(f'PRAGMA index_info("{idx[1]}")').fetchall()]
+        if sorted(cols) == sorted(KEY_COLS):
+            return True
+    return False
+
+def try_create_unique_index(conn: sqlite3.Connection) -> bool:
+    """
+    Tenta criar o índice UNIQUE em ("QR Code","Building"). Falha (sem alterar nada)
+    se a tabela já tiver chaves duplicadas.
+    """
+    try:
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{UNIQUE_INDEX_NAME}" ON "{TABLE}" ("QR Code","Building")')
+        return True
+    except sqlite3.DatabaseError as e:
+        print(f"⚠️ Não foi possível criar índice UNIQUE em (QR Code, Building): {e}")
+        return False
+
+def bulk_apply_rows(conn: sqlite3.Connection, rows: List[Dict[str, Any]], existing_cols: List[str],
+                    use_on_conflict: bool) -> Tuple[int, int]:
+    """
+    Aplica todas as linhas de uma vez, numa única transação (SAVEPOINT):
+    1) executemany numa tabela temporária com PK (QR Code, Building) — a última linha vence,
+       como no modo linha-a-linha;
+    2) UPDATE/INSERT set-based (ou INSERT ... ON CONFLICT quando há índice UNIQUE).
+    Retorna (inseridos, atualizados) contados exatamente como upsert_row_update_then_insert.
+    """
+    cols = [c for c in COLS if c in existing_cols]
+    if not all(k in cols for k in KEY_COLS):
+        raise RuntimeError(f"tabela '{TABLE}' sem colunas-chave {KEY_COLS}")
+    set_cols = [c for c in cols if c not in KEY_COLS]
+    col_list = ",".join(f'"{c}"' for c in cols)
+    set_list = ",".join(f'"{c}"' for c in set_cols)
+    same_key = f's."QR Code" = "{TABLE}"."QR Code" AND s."Building" = "{TABLE}"."Building"'
+    key_match = 's."QR Code" = k.qr AND s."Building" = k.bld'
+
+    conn.execute("SAVEPOINT el_bulk")
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS temp."{STAGE_TABLE}"')
+        conn.execute(f'CREATE TEMP TABLE "{STAGE_TABLE}" ({col_list}, PRIMARY KEY ("QR Code","Building"))')
+        conn.executemany(
+            f'INSERT OR REPLACE INTO temp."{STAGE_TABLE}" ({col_list}) VALUES ({",".join("?" * len(cols))})',
+            [[row.get(c, "") for c in cols] for row in rows],
+        )
+
+        # Chaves já existentes no alvo: uma varredura da tabela, indexada à parte,
+        # evita buscas lineares quando o alvo não tem índice em (QR Code, Building).
+        conn.execute('DROP TABLE IF EXISTS temp."_el_target_keys"')
+        conn.execute(f'CREATE TEMP TABLE "_el_target_keys" AS SELECT DISTINCT "QR Code" AS qr, "Building" AS bld FROM "{TABLE}"')
+        conn.execute('CREATE INDEX temp."_el_target_keys_ix" ON "_el_target_keys" (qr, bld)')
+        existing = {
+            (r[0], r[1]) for r in conn.execute(
+                f'SELECT s."QR Code", s."Building" FROM temp."{STAGE_TABLE}" s '
+                f'JOIN temp."_el_target_keys" k ON {key_match}')
+        }
+
+        if use_on_conflict:
+            if set_cols:
+                conflict = "DO UPDATE SET " + ", ".join(f'"{c}"=excluded."{c}"' for c in set_cols)
+            else:
+                conflict = "DO NOTHING"
+            conn.execute(f'''
+                INSERT INTO "{TABLE}" ({col_list})
+                SELECT {col_list} FROM temp."{STAGE_TABLE}" WHERE true
+                ON CONFLICT ("QR Code","Building") {conflict}
+            ''')
+        else:
+            if set_cols:
+                conn.execute(f'''
+                    UPDATE "{TABLE}"
+                    SET ({set_list}) = (SELECT {set_list} FROM temp."{STAGE_TABLE}" s WHERE {same_key})
+                    WHERE EXISTS (SELECT 1 FROM temp."{STAGE_TABLE}" s WHERE {same_key})
+                ''')
+            conn.execute(f'''
+                INSERT INTO "{TABLE}" ({col_list})
+                SELECT {col_list} FROM temp."{STAGE_TABLE}" s
+                WHERE NOT EXISTS (SELECT 1 FROM temp."_el_target_keys" k WHERE {key_match})
+            ''')
+
+        conn.execute(f'DROP TABLE temp."{STAGE_TABLE}"')
+        conn.execute('DROP TABLE temp."_el_target_keys"')
+        conn.execute("RELEASE el_bulk")
+    except Exception:
+        conn.execute("ROLLBACK TO el_bulk")
+        conn.execute("RELEASE el_bulk")
+        raise
+
+    # Mesma contagem do modo linha-a-linha: a 1ª ocorrência de uma chave nova é
+    # "inserida"; chave já existente no alvo (ou repetida nos JSONs) é "atualizada".
+    inserted = updated = 0
+    for row in rows:
+        key = (row.get("QR Code", ""), row.get("Building", ""))
+        if key in existing:
+            updated += 1
+        else:
+            inserted += 1
+            existing.add(key)
+    return inserted, updated
+
+MANIFEST_TABLE = "_loader_manifest_EL"
+
+def ensure_manifest_table(conn: sqlite3.Connection):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{MANIFEST_TABLE}" (
+            path       TEXT PRIMARY KEY,
+            mtime_ns   INTEGER,
+            size       INTEGER,
+            sha256     TEXT,
+            applied_at TEXT
+        )
+    ''')
+
+def load_manifest(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int, str]]:
+    """
+    {arquivo: (mtime_ns, size, sha256)} do último JSON aplicado com sucesso.
+    """
+    cur = conn.execute(f'SELECT path, mtime_ns, size, sha256 FROM "{MANIFEST_TABLE}"')
+    return {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall()}
+
+def record_manifest(conn: sqlite3.Connection, entries: List[Tuple[str, int, int, str]]):
+    """
+    Grava (arquivo, mtime_ns, size, sha256) — na mesma transação dos upserts.
+    """
+    conn.executemany(
+        f'INSERT OR REPLACE INTO "{MANIFEST_TABLE}" (path, mtime_ns, size, sha256, applied_at) '
+        f"VALUES (?, ?, ?, ?, datetime('now'))",
+        entries,
+    )
+
+def prune_manifest(conn: sqlite3.Connection, paths: List[str]):
+    conn.executemany(f'DELETE FROM "{MANIFEST_TABLE}" WHERE path = ?', [(p,) for p in paths])
+
 def build_row_from_json(qr_code: str, building: str, sd: Dict[str, Any], default_attr: str) -> Dict[str, Any]:
     """
-    Monta o dicionário de linha com defaults e regras EL.
+    Monta o dicionário de linha com defaults e regras EL (sdi_rules_EL, as mesmas do app
+    e da exportação).
     - UBC Asset Tag: se vazio, usar Branch Panel.
     - Description: baseado no valor final do UBC/Branch.
     """
-    ubc_raw = (sd.get("UBC Asset Tag") or "").strip()
-    branch  = (sd.get("Branch Panel") or "").strip()
-    ubc = ubc_raw if ubc_raw else branch
-
-    row = {
-        "QR Code": qr_code,
-        "Building": building,
-        "Description": compute_description(ubc),
-        "UBC Asset Tag": ubc,  # já com fallback
-        "Branch Panel": branch,
-        "Ampere": (sd.get("Ampere") or "").strip(),
-        "Supply From": (sd.get("Supply From") or "").strip(),
-        "Volts": (sd.get("Volts") or "").strip(),
-        "Location": (sd.get("Location") or "").strip(),
-        "Asset Group": (sd.get("Asset Group") or "").strip(),  # manter se vier
-        "Attribute": (sd.get("Attribute") or "").strip(),
-        "Approved": (sd.get("Approved") or "").strip(),
-    }
-    if not row["Attribute"] and default_attr:
-        row["Attribute"] = default_attr
-    return row
+    return sdi_row(qr_code, building, sd, default_attr)
 
 def preview_rows(conn: sqlite3.Connection, limit: int = 10):
     cur = conn.cursor()
@@ -143,7 +296,220 @@ def preview_rows(conn: sqlite3.Connection, limit: int = 10):
     except Exception as e:
         print(f"⚠️ Não foi possível gerar amostra: {e}")
 
-def main():
+def list_photo_keys(img_dir: str) -> set:
+    """(qr, building, seq) de todas as fotos presentes (uma única listagem da pasta)."""
+    keys = set()
+    try:
+        with os.scandir(img_dir) as it:
+            for de in it:
+                m = IMG_NAME_RE.match(de.name)
+                if m:
+                    keys.add(m.groups()[:3])
+    except OSError as e:
+        print(f"⚠️ Pasta de fotos não acessível ({e}); todas as linhas sairão com Missed Photo = YES")
+    return keys
+
+def export_dataset(path: str, filtro: str, workers: int, processes: int) -> int:
+    """
+    Exporta os JSONs revisados para CSV/XLSX, linha a linha (gerador), aplicando os
+    filtros da URL do dashboard. Retorna o número de linhas gravadas.
+    """
+    args = dict(parse_qsl((filtro or "").lstrip("?")))
+    filters = dashboard_filters(args)
+    search = args.get("search") or args.get("search[value]", "")
+    default_attr = ""
+    if Path(DB_PATH).exists():
+        with sqlite3.connect(DB_PATH) as conn:
+            default_attr = fetch_default_attribute(conn)
+
+    files = sorted(fn for fn in os.listdir(JSON_DIR) if JSON_NAME_RE.match(fn))
+    photos = list_photo_keys(IMG_DIR)
+    print(f"🧩 JSONs EL: {len(files)} | fotos indexadas: {len(photos)}")
+
+    def rows():
+        for rec in iter_json_records(JSON_DIR, files, JSON_NAME_RE, threads=workers, processes=processes):
+            if rec.error is not None or not isinstance(rec.structured_data, dict):
+                print(f"⚠️ Erro lendo {rec.filename}: {rec.error or 'structured_data inválido'}")
+                continue
+            missed = not all((rec.qr, rec.building, seq) in photos for seq in REQUIRED_PHOTO_SEQS)
+            item = dashboard_item(rec.qr, rec.building, rec.structured_data, rec.doc.get("modified", False),
+                                  missed, default_attr)
+            if filter_items([item], filters, search):
+                yield export_row(rec.qr, rec.building, rec.structured_data, bool(rec.doc.get("modified")),
+                                 missed, default_attr)
+
+    return write_export(rows(), path)
+
+# === Reconciliação JSON <-> DB ===
+APPROVED_TRUE = {"1", "true", "yes"}
+
+def normalize_row(row: Dict[str, Any], cols: List[str]) -> Tuple[str, ...]:
+    """
+    Forma canônica de uma linha para comparação: valores aparados e Approved "1"/"" (o app
+    grava "1", o loader copia o valor do JSON, normalmente "True"). UBC (fallback para
+    Branch Panel) e Description já vêm derivados do lado JSON (build_row_from_json); o lado
+    DB é comparado como está gravado, para que uma Description editada à mão apareça.
+    """
+    r = {c: ("" if row.get(c) is None else str(row.get(c))).strip() for c in cols}
+    if "Approved" in r:
+        r["Approved"] = "1" if r["Approved"].lower() in APPROVED_TRUE else ""
+    return tuple(r[c] for c in cols)
+
+def load_db_map(conn: sqlite3.Connection, cols: List[str]) -> Tuple[Dict[Tuple[str, str], Tuple[str, ...]], int]:
+    """Uma varredura de sdi_dataset_EL -> {(qr, building): linha normalizada}, e nº de chaves duplicadas."""
+    col_list = ",".join(f'"{c}"' for c in cols)
+    db_map, dups = {}, 0
+    for r in conn.execute(f'SELECT {col_list} FROM "{TABLE}"'):
+        row = dict(zip(cols, r))
+        key = (str(row["QR Code"] or "").strip(), str(row["Building"] or "").strip())
+        if key in db_map:
+            dups += 1
+        db_map[key] = normalize_row(row, cols)
+    return db_map, dups
+
+def load_json_map(json_dir: str, default_attr: str, workers: int, processes: int):
+    """
+    {(qr, building): linha do loader} para todos os JSONs EL (leitura concorrente).
+    Retorna (mapa, falhas).
+    """
+    files = sorted(fn for fn in os.listdir(json_dir) if JSON_NAME_RE.match(fn))
+    json_map, failed = {}, 0
+    for rec in iter_json_records(json_dir, files, JSON_NAME_RE, threads=workers, processes=processes):
+        if rec.error is not None or not isinstance(rec.structured_data, dict):
+            print(f"⚠️ Erro lendo {rec.filename}: {rec.error or 'structured_data inválido'}")
+            failed += 1
+            continue
+        json_map[(rec.qr, rec.building)] = build_row_from_json(rec.qr, rec.building, rec.structured_data, default_attr)
+    return json_map, failed
+
+def reconcile(json_map: Dict, db_map: Dict, cols: List[str]) -> Dict[str, Any]:
+    """
+    Diferenças por conjunto de chaves e, nas chaves comuns, por linha normalizada.
+    mismatched: {chave: [(coluna, valor_db, valor_json), ...]}
+    """
+    json_norm = {k: normalize_row(row, cols) for k, row in json_map.items()}
+    json_keys, db_keys = set(json_norm), set(db_map)
+    changed = {k for k in json_keys & db_keys if json_norm[k] != db_map[k]}
+    mismatched = {
+        k: [(c, d, j) for c, d, j in zip(cols, db_map[k], json_norm[k]) if d != j]
+        for k in changed
+    }
+    return {
+        "only_json": sorted(json_keys - db_keys),
+        "only_db": sorted(db_keys - json_keys),
+        "mismatched": mismatched,
+        "matching": len(json_keys & db_keys) - len(changed),
+    }
+
+def write_reconcile_report(path: str, result: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["tipo", "QR Code", "Building", "coluna", "valor_db", "valor_json"])
+        for qr, bld in result["only_json"]:
+            w.writerow(["so_json", qr, bld, "", "", ""])
+        for qr, bld in result["only_db"]:
+            w.writerow(["so_db", qr, bld, "", "", ""])
+        for (qr, bld), diffs in sorted(result["mismatched"].items()):
+            for col, d, j in diffs:
+                w.writerow(["divergente", qr, bld, col, d, j])
+
+def run_reconciliation(args) -> Dict[str, Any]:
+    started = time.time()
+    with sqlite3.connect(DB_PATH) as conn:
+        existing_cols = check_table_columns(conn)
+        cols = [c for c in COLS if c in existing_cols]
+        if not all(k in cols for k in KEY_COLS):
+            print(f"❌ Tabela '{TABLE}' sem colunas-chave {KEY_COLS}")
+            return {}
+        default_attr = fetch_default_attribute(conn)
+
+        json_map, failed = load_json_map(JSON_DIR, default_attr, args.workers, args.parse_processes)
+        db_map, dups = load_db_map(conn, cols)
+        result = reconcile(json_map, db_map, cols)
+
+        print("—" * 60)
+        print(f"🔎 Reconciliação JSON x {TABLE} ({time.time() - started:.1f}s)")
+        print(f"   JSONs: {len(json_map)} (falhas de leitura: {failed}) | linhas no DB: {len(db_map)}"
+              + (f" (+{dups} chaves duplicadas)" if dups else ""))
+        print(f"   Iguais      : {result['matching']}")
+        print(f"   Só no JSON  : {len(result['only_json'])}")
+        print(f"   Só no DB    : {len(result['only_db'])} (não são apagadas)")
+        print(f"   Divergentes : {len(result['mismatched'])}")
+        by_col = {}
+        for diffs in result["mismatched"].values():
+            for col, _d, _j in diffs:
+                by_col[col] = by_col.get(col, 0) + 1
+        for col, n in sorted(by_col.items(), key=lambda kv: -kv[1]):
+            print(f"      {col}: {n}")
+        for (qr, bld), diffs in sorted(result["mismatched"].items())[:args.amostra]:
+            detail = "; ".join(f"{c}: '{d}' (DB) ≠ '{j}' (JSON)" for c, d, j in diffs)
+            print(f"   • QR={qr} | Bld={bld} | {detail}")
+
+        if args.relatorio:
+            write_reconcile_report(args.relatorio, result)
+            print(f"📝 Relatório completo em {args.relatorio}")
+
+        if not args.aplicar:
+            print("ℹ️ Nada foi gravado (use --aplicar para corrigir o DB).")
+            return result
+
+        keys = result["only_json"] + sorted(result["mismatched"])
+        if not keys:
+            print("✅ DB já está em dia com os JSONs.")
+            return result
+        ins, upd = bulk_apply_rows(conn, [json_map[k] for k in keys], existing_cols, has_unique_key_index(conn))
+        conn.commit()
+        print(f"✅ Aplicado: {ins} inseridas, {upd} atualizadas (apenas linhas novas/divergentes)")
+    return result
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Loader EL: JSON -> SQLite (sdi_dataset_EL)")
+    ap.add_argument("--bulk", action="store_true",
+                    help="aplica todas as linhas de uma vez (tabela temporária + SQL set-based, 1 transação)")
+    ap.add_argument("--create-unique-index", action="store_true",
+                    help="com --bulk: tenta criar índice UNIQUE em (QR Code, Building) para usar ON CONFLICT")
+    ap.add_argument("--full", action="store_true",
+                    help="ignora o manifesto e reprocessa todos os JSONs")
+    ap.add_argument("--workers", type=int, default=DEFAULT_THREADS,
+                    help=f"threads de leitura dos JSONs (padrão: {DEFAULT_THREADS})")
+    ap.add_argument("--parse-processes", type=int, default=0,
+                    help="processos para o parse dos JSONs (0 = parse nas próprias threads)")
+    ap.add_argument("--export", metavar="ARQUIVO",
+                    help="exporta os JSONs revisados para .csv ou .xlsx (não carrega o DB)")
+    ap.add_argument("--filtro", default="",
+                    help='com --export: filtros da URL do dashboard, ex. "flagged=true&building=101"')
+    ap.add_argument("--reconciliar", action="store_true",
+                    help="compara JSONs e DB e relata as diferenças (não grava sem --aplicar)")
+    ap.add_argument("--aplicar", action="store_true",
+                    help="com --reconciliar: grava só as linhas novas/divergentes")
+    ap.add_argument("--relatorio", metavar="CSV",
+                    help="com --reconciliar: grava todas as diferenças neste CSV")
+    ap.add_argument("--amostra", type=int, default=20,
+                    help="com --reconciliar: quantas divergências mostrar na tela (padrão: 20)")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.export:
+        if not Path(JSON_DIR).exists():
+            print(f"❌ Pasta JSON não encontrada: {JSON_DIR}")
+            return
+        try:
+            n = export_dataset(args.export, args.filtro, args.workers, args.parse_processes)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return
+        print(f"✅ Exportadas {n} linhas para {args.export}")
+        return
+
+    if args.reconciliar:
+        if not Path(DB_PATH).exists():
+            print(f"❌ DB não encontrado: {DB_PATH}")
+            return
+        run_reconciliation(args)
+        return
+
     db = Path(DB_PATH)
     if not db.exists():
         print(f"❌ DB não encontrado: {DB_PATH}")
@@ -155,8 +521,13 @@ def main():
         print(f"❌ Pasta JSON não encontrada: {JSON_DIR}")
         return
 
-    # Seleciona apenas JSONs *_EL_*.json
-    all_jsons = [fn for fn in os.listdir(json_dir) if fn.lower().endswith(".json") and not fn.endswith("_raw_ocr.json")]
+    # Seleciona apenas JSONs *_EL_*.json (scandir já traz mtime/tamanho para o manifesto)
+    stats = {}
+    with os.scandir(json_dir) as it:
+        for de in it:
+            if de.name.lower().endswith(".json") and not de.name.endswith("_raw_ocr.json"):
+                stats[de.name] = de
+    all_jsons = list(stats)
     files = [fn for fn in all_jsons if JSON_NAME_RE.match(fn)]
     files.sort()
 
@@ -166,32 +537,60 @@ def main():
         return
 
     updated = inserted = failed = 0
+    unchanged = 0
+    staged = []  # (fn, row, manifest_entry) no modo --bulk
 
     with sqlite3.connect(DB_PATH) as conn:
         conn.row_factory = sqlite3.Row
         existing_cols = check_table_columns(conn)
         default_attr = fetch_default_attribute(conn)
 
-        for fn in files:
-            m = JSON_NAME_RE.match(fn)
-            qr_code, building = m.groups()
+        ensure_manifest_table(conn)
+        manifest = load_manifest(conn)
+        removed = sorted(set(manifest) - set(files))
 
-            fpath = json_dir / fn
+        to_read = []
+        for fn in files:
             try:
-                with open(fpath, "r", encoding="utf-8") as f:
-                    doc = json.load(f)
-            except Exception as e:
+                st = stats[fn].stat()
+            except OSError as e:
                 print(f"⚠️ Erro lendo {fn}: {e}")
                 failed += 1
                 continue
+            stats[fn] = st
+            last = manifest.get(fn)
+            if not args.full and last and (last[0], last[1]) == (st.st_mtime_ns, st.st_size):
+                unchanged += 1
+                continue
+            to_read.append(fn)
 
-            sd = doc.get("structured_data") or {}
+        for rec in iter_json_records(json_dir, to_read, JSON_NAME_RE, threads=args.workers,
+                                     processes=args.parse_processes, with_hash=True):
+            fn, qr_code, building = rec.filename, rec.qr, rec.building
+            if rec.error is not None:
+                print(f"⚠️ Erro lendo {fn}: {rec.error}")
+                failed += 1
+                continue
+
+            st = stats[fn]
+            entry = (fn, st.st_mtime_ns, st.st_size, rec.sha256)
+            last = manifest.get(fn)
+            if not args.full and last and last[2] == rec.sha256:
+                # só o mtime mudou (cópia/touch): conteúdo já aplicado
+                record_manifest(conn, [entry])
+                unchanged += 1
+                continue
+
+            sd = rec.structured_data
             if not isinstance(sd, dict):
                 print(f"⚠️ structured_data inválido em {fn}, pulando.")
                 failed += 1
                 continue
 
             row = build_row_from_json(qr_code, building, sd, default_attr)
+            if args.bulk:
+                staged.append((fn, row, entry))
+                continue
 
             try:
                 action = upsert_row_update_then_insert(conn, row, existing_cols)
@@ -199,10 +598,40 @@ def main():
                     updated += 1
                 else:
                     inserted += 1
+                record_manifest(conn, [entry])
             except Exception as e:
                 print(f"❌ Falha ao inserir/atualizar {fn}: {e}")
                 failed += 1
 
+        if staged:
+            use_on_conflict = has_unique_key_index(conn) or (args.create_unique_index and try_create_unique_index(conn))
+            modo = "INSERT ... ON CONFLICT" if use_on_conflict else "UPDATE/INSERT set-based"
+            print(f"📦 Modo bulk: {len(staged)} linhas via tabela temporária ({modo})")
+            try:
+                ins, upd = bulk_apply_rows(conn, [row for _fn, row, _e in staged], existing_cols, use_on_conflict)
+                inserted += ins
+                updated += upd
+                record_manifest(conn, [e for _fn, _row, e in staged])
+            except Exception as e:
+                # Nada foi aplicado (rollback do savepoint): refaz linha a linha para
+                # isolar e contar as falhas exatamente como no modo normal.
+                print(f"⚠️ Bulk falhou ({e}); aplicando linha a linha.")
+                for fn, row, entry in staged:
+                    try:
+                        action = upsert_row_update_then_insert(conn, row, existing_cols)
+                        if action == "updated":
+                            updated += 1
+                        else:
+                            inserted += 1
+                        record_manifest(conn, [entry])
+                    except Exception as e:
+                        print(f"❌ Falha ao inserir/atualizar {fn}: {e}")
+                        failed += 1
+
+        # JSONs apagados: saem do manifesto; as linhas no DB ficam (o loader nunca apaga).
+        if removed:
+            prune_manifest(conn, removed)
+
         conn.commit()
 
         # Resumo final
@@ -218,6 +647,10 @@ def main():
         print(f"   Inseridos : {inserted}")
         print(f"   Atualizados: {updated}")
         print(f"   Falhas    : {failed}")
+        if not args.full:
+            print(f"   Inalterados (manifesto): {unchanged}")
+        if removed:
+            print(f"   Removidos do diretório: {len(removed)} (saíram do manifesto; linhas no DB mantidas)")
         print(f"📊 Total atual em {TABLE}: {total}")
 
         preview_rows(conn, limit=10)